@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+# Allow `python benchmarks/bench_pipeline.py` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeSSHServer, MockOllama, FakeTelegram, write_client_key
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+class Results:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, scenario: str, hosts: int, samples: list, wall: float):
+        ops = len(samples)
+        self.rows.append({
+            "scenario": scenario,
+            "hosts": hosts,
+            "ops": ops,
+            "p50": percentile(samples, 50),
+            "p95": percentile(samples, 95),
+            "p99": percentile(samples, 99),
+            "mean": statistics.mean(samples) if samples else 0.0,
+            "throughput": ops / wall if wall > 0 else 0.0
+        })
+
+    def render(self) -> str:
+        header = f"{'scenario':<18} {'hosts':>5} {'ops':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9} {'ops/s':>8}"
+        lines = [header, "-" * len(header)]
+        for r in self.rows:
+            lines.append(
+                f"{r['scenario']:<18} {r['hosts']:>5} {r['ops']:>5} {r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} "
+                f"{r['p99'] * 1000:>9.1f} {r['mean'] * 1000:>9.1f} {r['throughput']:>8.2f}"
+            )
+        return "\n".join(lines)
+
+async def timed(coro_fn, *args):
+    start = time.perf_counter()
+    await coro_fn(*args)
+    return time.perf_counter() - start
+
+async def run_batch(coro_fn, arg_lists, iterations: int):
+    """
+    Runs coro_fn(*args) for every entry concurrently, `iterations` times.
+    Returns (per-op latencies, total wall time).
+    """
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        samples += await asyncio.gather(*(timed(coro_fn, *a) for a in arg_lists))
+    return samples, time.perf_counter() - start
+
+async def bench(args):
+    from guardian_monitor import ssh_tools, bot, nodes, perf, incidents
+    from guardian_monitor.tools import _async_get_metrics, execute_terminal_command
+
+    loop = asyncio.get_running_loop()
+    if args.workers:
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+
+    workdir = tempfile.mkdtemp(prefix="guardmon-bench-")
+    key_path = write_client_key(os.path.join(workdir, "id_rsa"))
+    # Benchmark incidents go to a throwaway log
+    incidents.store = incidents.IncidentStore(os.path.join(workdir, "incidents.jsonl"))
+    ssh = FakeSSHServer(latency=args.ssh_latency)
+    ollama = MockOllama(latency=args.llm_latency, token_latency=args.token_latency)
+    telegram = FakeTelegram(latency=args.telegram_latency)
+
+    os.environ["OLLAMA_BASE_URL"] = ollama.url
+    os.environ["TELEGRAM_CHAT_ID"] = "1"
+
+    from telegram.ext import ApplicationBuilder
+    app = ApplicationBuilder().token("123:bench").base_url(telegram.base_url).build()
+    await app.initialize()
+    bot.BotGlobals.app = app
+
+    results = Results()
+    original_config = ssh_tools.CONFIG_PATH
+
+    async def run_cmd(host):
+        await loop.run_in_executor(None, ssh_tools.run_command, "uptime", host)
+
+    async def tool_call(host):
+        await loop.run_in_executor(None, execute_terminal_command.invoke, {"command": "df -h", "target_host": host})
+
+    async def metrics(host):
+        await _async_get_metrics(host)
+
+    async def incident(host):
+        # monitor -> diagnose (mock LLM) -> review (auto-approved, Telegram) -> execute
+        state = {
+            "metrics": {"report": await _async_get_metrics(host)},
+            "anomalies": ["Manual System Check Requested"],
+            "investigation_history": [],
+            "steps_count": 0,
+            # The action runs on the simulated host too
+            "host": host
+        }
+        state = await nodes.diagnose_node(state)
+        state = await nodes.review_node(state)
+        await nodes.execute_node(state)
+
+    try:
+        # Local-only stages first
+        samples, wall = await run_batch(nodes.monitor_node, [({},)], args.iterations)
+        results.add("monitor_node", 1, samples, wall)
+
+        for count in args.hosts:
+            ssh_tools.CONFIG_PATH = os.path.join(workdir, f"hosts_{count}.json")
+            names = ssh.write_hosts_file(ssh_tools.CONFIG_PATH, count, key_path)
+            host_args = [(n,) for n in names]
+
+            for scenario, fn in (("run_command", run_cmd), ("tool_call", tool_call), ("metrics_sweep", metrics)):
+                samples, wall = await run_batch(fn, host_args, args.iterations)
+                results.add(scenario, count, samples, wall)
+                print(f"  {scenario} x{count} done ({wall:.1f}s)", file=sys.stderr)
+
+            if count <= args.max_incident_hosts:
+                samples, wall = await run_batch(incident, host_args, args.iterations)
+                results.add("incident_loop", count, samples, wall)
+                print(f"  incident_loop x{count} done ({wall:.1f}s)", file=sys.stderr)
+    finally:
+        ssh_tools.CONFIG_PATH = original_config
+        await app.shutdown()
+        ssh.close()
+        ollama.close()
+        telegram.close()
+
+    summary = (
+        f"{results.render()}\n\n"
+        f"SSH commands: {ssh.commands} | LLM calls: {ollama.requests} | Telegram calls: {telegram.requests}\n"
+        f"ssh_latency={args.ssh_latency}s llm_latency={args.llm_latency}s telegram_latency={args.telegram_latency}s "
+        f"workers={args.workers or 'default'}\n\n"
+        f"Internal breakdown (guardian_monitor.perf):\n{perf.format_summary()}"
+    )
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="GuardMonBot pipeline benchmarks (local fakes only)")
+    parser.add_argument("--hosts", default="1,10,100", help="Comma-separated simulated host counts")
+    parser.add_argument("--iterations", type=int, default=3, help="Rounds per scenario")
+    parser.add_argument("--ssh-latency", type=float, default=0.0, help="Extra latency per remote command (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Mock Ollama time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Mock Ollama delay per streamed token (s)")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Fake Telegram API latency (s)")
+    parser.add_argument("--max-incident-hosts", type=int, default=100, help="Skip incident loops above this host count")
+    parser.add_argument("--workers", type=int, default=0, help="Default executor size (0 = Python default)")
+    parser.add_argument("--output", help="Also append the report to this file (e.g. bench_output.txt)")
+    args = parser.parse_args()
+    args.hosts = [int(h) for h in args.hosts.split(",") if h.strip()]
+
+    report = asyncio.run(bench(args))
+    print(report)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(f"# {time.strftime('%Y-%m-%d %H:%M:%S')}\n{report}\n\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import socket
+import threading
+import logging
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import paramiko
+
+# Local stand-ins for the external services GuardMonBot talks to:
+#  - FakeSSHServer: paramiko server that runs commands locally (like a real host would)
+#  - MockOllama: /api/chat endpoint with configurable latency and canned replies
+#  - FakeTelegram: Bot API endpoint that accepts sendMessage & co.
+
+# Clients closing connections abruptly is normal here, don't log it as an error
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+class _SSHHandler(paramiko.ServerInterface):
+    def __init__(self, server: "FakeSSHServer"):
+        self.server = server
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server._exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+class FakeSSHServer:
+    """
+    SSH server on 127.0.0.1 accepting any public key. Commands are executed
+    locally after an optional artificial latency; stdin is forwarded so the
+    push agent (`python3 -u -`) can be streamed through it too.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.commands = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(256)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            try:
+                transport.start_server(server=_SSHHandler(self))
+            except (paramiko.SSHException, EOFError):
+                transport.close()
+
+    def _exec(self, channel, cmd):
+        self.commands += 1
+        if self.latency:
+            time.sleep(self.latency)
+        proc = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        def pump_stdin():
+            try:
+                while True:
+                    data = channel.recv(65536)
+                    if not data:
+                        break
+                    proc.stdin.write(data)
+                    proc.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            finally:
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        def pump_stderr():
+            for chunk in iter(lambda: proc.stderr.read1(65536), b""):
+                channel.sendall_stderr(chunk)
+
+        threading.Thread(target=pump_stdin, daemon=True).start()
+        err_thread = threading.Thread(target=pump_stderr, daemon=True)
+        err_thread.start()
+        try:
+            for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+                channel.sendall(chunk)
+        except OSError:
+            proc.kill()
+        err_thread.join()
+        try:
+            channel.send_exit_status(proc.wait())
+            channel.close()
+        except OSError:
+            pass
+
+    def write_hosts_file(self, path: str, count: int, key_path: str):
+        """
+        Writes a hosts.json with `count` SSH hosts all pointing at this server.
+        """
+        hosts = [
+            {"name": f"sim{i}", "type": "ssh", "ip": "127.0.0.1", "port": self.port,
+             "user": "bench", "key_path": key_path, "description": "Simulated host"}
+            for i in range(count)
+        ]
+        with open(path, "w") as f:
+            json.dump({"hosts": hosts}, f)
+        return [h["name"] for h in hosts]
+
+    def close(self):
+        self._running = False
+        self._sock.close()
+
+def write_client_key(path: str) -> str:
+    paramiko.RSAKey.generate(2048).write_private_key_file(path)
+    os.chmod(path, 0o600)
+    return path
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            # Telegram requests may be form-encoded
+            return {}
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class _HTTPStub:
+    def __init__(self, handler_cls):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler_cls)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.port = self.server.server_address[1]
+        self.requests = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class _OllamaHandler(_QuietHandler):
+    def do_GET(self):
+        # /api/tags, /api/version: enough for health checks
+        self._send_json({"models": [{"name": "bench"}], "version": "0.0.0"})
+
+    def do_POST(self):
+        stub = self.server.stub
+        stub.requests += 1
+        req = self._read_json()
+        time.sleep(stub.latency)
+        content = stub.reply(req)
+        model = req.get("model", "bench")
+        final = {
+            "model": model, "created_at": "2026-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": ""},
+            "done": True, "done_reason": "stop",
+            "total_duration": int(stub.latency * 1e9), "prompt_eval_count": 1, "eval_count": 1
+        }
+
+        if req.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            # Stream word by word so token streaming paths are exercised
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                chunk = {"model": model, "created_at": final["created_at"], "done": False,
+                         "message": {"role": "assistant", "content": word + (" " if i < len(words) - 1 else "")}}
+                self.wfile.write((json.dumps(chunk) + "\n").encode())
+                time.sleep(stub.token_latency)
+            self.wfile.write((json.dumps(final) + "\n").encode())
+        else:
+            final["message"]["content"] = content
+            self._send_json(final)
+
+class MockOllama(_HTTPStub):
+    """
+    Ollama-compatible /api/chat. `reply(request_json) -> str` decides the content.
+    """
+    DEFAULT_REPLY = json.dumps({
+        "diagnosis": "Process 'bench' (PID 1) is idle. Checking process list.",
+        "proposed_action": "ps aux",
+        "action_type": "investigate"
+    })
+
+    def __init__(self, latency: float = 0.2, token_latency: float = 0.0, reply=None):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.reply = reply or (lambda req: self.DEFAULT_REPLY)
+        super().__init__(_OllamaHandler)
+
+class _TelegramHandler(_QuietHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        stub.requests += 1
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        self._read_json()
+        time.sleep(stub.latency)
+        stub.methods[method] = stub.methods.get(method, 0) + 1
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot",
+                      "can_join_groups": False, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif method in ("sendMessage", "editMessageText"):
+            stub.message_id += 1
+            result = {"message_id": stub.message_id, "date": int(time.time()),
+                      "chat": {"id": 1, "type": "private"}, "text": "ok"}
+        else:
+            result = True
+        self._send_json({"ok": True, "result": result})
+
+    do_GET = do_POST
+
+class FakeTelegram(_HTTPStub):
+    """
+    Minimal Telegram Bot API. Use `base_url` with ApplicationBuilder().base_url(...).
+    """
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.methods = {}
+        self.message_id = 0
+        super().__init__(_TelegramHandler)
+
+    @property
+    def base_url(self) -> str:
+        return f"{self.url}/bot"
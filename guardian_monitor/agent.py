@@ -0,0 +1,158 @@
+"""
+GuardMonBot push agent.
+
+Samples /proc locally and writes one compact NDJSON frame per interval to stdout.
+It only uses the standard library so the central bot can stream this file to
+`python3 -u -` over a single SSH channel without installing anything on the host.
+
+Frame format (keys kept short on purpose):
+    {"v": 1, "t": <epoch>, "h": <hostname>,
+     "cpu": <% busy>, "mem": <% used>, "load": [1m, 5m, 15m],
+     "disk": {<mount>: [used_pct, inode_pct, size_gb]},
+     "net": {<iface>: [rx_Bps, tx_Bps, rx_pps, tx_pps, errs_ps, drop_ps]}}
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+FRAME_VERSION = 1
+
+# Pseudo / in-memory filesystems (same idea as metrics.IGNORED_FS_TYPES)
+IGNORED_FS_TYPES = {
+    "tmpfs", "devtmpfs", "squashfs", "overlay", "proc", "sysfs", "cgroup", "cgroup2",
+    "devpts", "mqueue", "efivarfs", "autofs", "tracefs", "debugfs", "securityfs",
+    "pstore", "bpf", "configfs", "fusectl", "hugetlbfs", "ramfs", "nsfs", "fuse.lxcfs"
+}
+
+def read_cpu_times():
+    with open("/proc/stat") as f:
+        # user nice system idle iowait irq softirq steal (guest time is already in user)
+        values = [int(v) for v in f.readline().split()[1:9]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    return sum(values), idle
+
+def read_mem_pct():
+    info = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            info[key] = int(value.split()[0])
+    total = info.get("MemTotal", 0)
+    available = info.get("MemAvailable", info.get("MemFree", 0))
+    return round((total - available) / total * 100, 2) if total else 0.0
+
+def read_load():
+    with open("/proc/loadavg") as f:
+        return [float(v) for v in f.read().split()[:3]]
+
+def read_disks():
+    disks = {}
+    with open("/proc/mounts") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or parts[2] in IGNORED_FS_TYPES:
+                continue
+            # /proc/mounts escapes spaces as \040
+            mount = parts[1].replace("\\040", " ")
+            try:
+                st = os.statvfs(mount)
+            except OSError:
+                continue
+            if st.f_blocks == 0:
+                continue
+            used = st.f_blocks - st.f_bfree
+            # Same formula as df: used / (used + available to non-root)
+            used_pct = round(used / (used + st.f_bavail) * 100, 1) if used + st.f_bavail else 0.0
+            inode_pct = round((st.f_files - st.f_ffree) / st.f_files * 100, 1) if st.f_files else 0.0
+            disks[mount] = [used_pct, inode_pct, round(st.f_blocks * st.f_frsize / 1024 ** 3, 1)]
+    return disks
+
+def read_net_counters():
+    counters = {}
+    with open("/proc/net/dev") as f:
+        for line in f:
+            if ":" not in line:
+                continue
+            iface, data = line.split(":", 1)
+            v = [int(x) for x in data.split()]
+            # rx_bytes, tx_bytes, rx_packets, tx_packets, errs, drops
+            counters[iface.strip()] = (v[0], v[8], v[1], v[9], v[2] + v[10], v[3] + v[11])
+    return counters
+
+def counter_delta(old, new):
+    """
+    Same wrap/reset handling as metrics.counter_delta.
+    """
+    if new >= old:
+        return new - old
+    if old < 2 ** 32:
+        wrapped = new + 2 ** 32 - old
+        if wrapped < 2 ** 31:
+            return wrapped
+    return new
+
+def run(interval: float, disk_every: int, out=sys.stdout):
+    hostname = socket.gethostname()
+    prev_cpu = read_cpu_times()
+    prev_net = read_net_counters()
+    prev_ts = time.monotonic()
+    disks = read_disks()
+    frame_no = 0
+
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        dt = now - prev_ts
+
+        total, idle = read_cpu_times()
+        d_total = total - prev_cpu[0]
+        cpu = round((1 - (idle - prev_cpu[1]) / d_total) * 100, 2) if d_total > 0 else 0.0
+        prev_cpu = (total, idle)
+
+        net_counters = read_net_counters()
+        net = {}
+        for iface, values in net_counters.items():
+            old = prev_net.get(iface)
+            if old is None:
+                continue
+            net[iface] = [round(counter_delta(o, n) / dt, 2) for o, n in zip(old, values)]
+        prev_net = net_counters
+        prev_ts = now
+
+        # statvfs on every mount is cheap, but not worth doing every sub-second frame
+        frame_no += 1
+        if frame_no % disk_every == 0:
+            disks = read_disks()
+
+        frame = {
+            "v": FRAME_VERSION,
+            "t": round(time.time(), 3),
+            "h": hostname,
+            "cpu": cpu,
+            "mem": read_mem_pct(),
+            "load": read_load(),
+            "disk": disks,
+            "net": net
+        }
+        try:
+            out.write(json.dumps(frame, separators=(",", ":")) + "\n")
+            out.flush()
+        except BrokenPipeError:
+            # The bot closed the channel
+            return
+
+def main():
+    parser = argparse.ArgumentParser(description="GuardMonBot metrics push agent")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between frames")
+    parser.add_argument("--disk-every", type=int, default=10, help="Refresh disk usage every N frames")
+    args = parser.parse_args()
+    try:
+        run(max(args.interval, 0.1), max(args.disk_every, 1))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
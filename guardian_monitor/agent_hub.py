@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+from typing import Dict, Optional
+from guardian_monitor.ssh_tools import load_hosts, _ssh_connect
+from guardian_monitor.agent import FRAME_VERSION
+
+# Push-agent mode: one long-lived stream per host instead of one exec per metric
+AGENT_MODE = os.getenv("AGENT_MODE", "False").lower() == "true"
+AGENT_INTERVAL = float(os.getenv("AGENT_INTERVAL", "1.0"))
+# Frames older than this are ignored and callers fall back to polling over SSH
+AGENT_STALE_AFTER = float(os.getenv("AGENT_STALE_AFTER", "10"))
+# Interpreter used on the monitored hosts
+AGENT_PYTHON = os.getenv("AGENT_PYTHON", "python3")
+AGENT_MAX_BACKOFF = 60.0
+
+AGENT_SOURCE = os.path.join(os.path.dirname(__file__), "agent.py")
+
+class AgentStream(threading.Thread):
+    """
+    Keeps one agent running on a host and forwards its frames to the hub.
+    SSH hosts get the agent source piped to `python3 -u -` over a single channel;
+    the local host runs it as a child process. Reconnects with exponential backoff.
+    """
+    def __init__(self, host_config: dict, hub: "AgentHub"):
+        super().__init__(name=f"agent-{host_config['name']}", daemon=True)
+        self.host_config = host_config
+        self.host_name = host_config["name"]
+        self.hub = hub
+        self._stop_event = threading.Event()
+        self._closer = None
+
+    def run(self):
+        backoff = 1.0
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                if self.host_config.get("type", "local") == "ssh":
+                    self._stream_ssh()
+                else:
+                    self._stream_local()
+            except Exception as e:
+                print(f"[Agent] Stream to {self.host_name} failed: {e}")
+
+            if self._stop_event.is_set():
+                break
+            # A stream that lived for a while was healthy: retry quickly
+            if time.monotonic() - started > AGENT_MAX_BACKOFF:
+                backoff = 1.0
+            print(f"[Agent] Reconnecting to {self.host_name} in {backoff:.0f}s")
+            self._stop_event.wait(backoff)
+            backoff = min(backoff * 2, AGENT_MAX_BACKOFF)
+
+    def _agent_args(self) -> list:
+        return ["--interval", str(AGENT_INTERVAL)]
+
+    def _stream_ssh(self):
+        with open(AGENT_SOURCE, "rb") as f:
+            source = f.read()
+
+        client = _ssh_connect(self.host_config)
+        self._closer = client.close
+        try:
+            transport = client.get_transport()
+            transport.set_keepalive(30)
+            channel = transport.open_session()
+            channel.exec_command(" ".join([AGENT_PYTHON, "-u", "-"] + self._agent_args()))
+            channel.sendall(source)
+            channel.shutdown_write()
+
+            for line in channel.makefile("r"):
+                if self._stop_event.is_set():
+                    break
+                self.hub.ingest(self.host_name, line)
+
+            if not self._stop_event.is_set() and channel.recv_exit_status() != 0:
+                err = channel.makefile_stderr("r").read().decode(errors="replace")
+                print(f"[Agent] Agent on {self.host_name} exited: {err[-300:]}")
+        finally:
+            client.close()
+
+    def _stream_local(self):
+        proc = subprocess.Popen(
+            [sys.executable, "-u", AGENT_SOURCE] + self._agent_args(),
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        self._closer = proc.kill
+        try:
+            for line in proc.stdout:
+                if self._stop_event.is_set():
+                    break
+                self.hub.ingest(self.host_name, line)
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._closer:
+            try:
+                self._closer()
+            except Exception:
+                pass
+
+class AgentHub:
+    """
+    Central store of the latest frame received from each host agent.
+    """
+    def __init__(self):
+        self._frames: Dict[str, dict] = {}
+        self._received: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._streams: Dict[str, AgentStream] = {}
+
+    def ingest(self, host: str, line) -> bool:
+        """
+        Parses one NDJSON frame. Invalid lines are dropped.
+        """
+        if isinstance(line, bytes):
+            line = line.decode(errors="replace")
+        try:
+            frame = json.loads(line)
+        except json.JSONDecodeError:
+            return False
+        if not isinstance(frame, dict) or frame.get("v") != FRAME_VERSION:
+            return False
+        with self._lock:
+            self._frames[host.lower()] = frame
+            self._received[host.lower()] = time.monotonic()
+        return True
+
+    def get_metrics(self, host: str, max_age: float = AGENT_STALE_AFTER) -> Optional[dict]:
+        """
+        Latest frame for a host in the same shape as the polled metrics
+        (see metrics.parse_df / metrics.collect_net_metrics), or None if stale/missing.
+        """
+        with self._lock:
+            frame = self._frames.get(host.lower())
+            received = self._received.get(host.lower(), 0.0)
+        age = time.monotonic() - received
+        if frame is None or age > max_age:
+            return None
+
+        disks = {
+            mount: {"size_gb": v[2], "used_pct": v[0], "inode_pct": v[1]}
+            for mount, v in frame.get("disk", {}).items()
+        }
+        net = {
+            iface: {"rx_Bps": v[0], "tx_Bps": v[1], "rx_pps": v[2], "tx_pps": v[3], "errs_ps": v[4], "drop_ps": v[5]}
+            for iface, v in frame.get("net", {}).items()
+        }
+        return {
+            "cpu_usage": frame.get("cpu", 0.0),
+            "ram_usage": frame.get("mem", 0.0),
+            "load": frame.get("load", []),
+            "disks": disks,
+            "net": net,
+            "age_s": round(age, 2)
+        }
+
+    def start(self, hosts: Optional[list] = None):
+        """
+        Starts a stream for every host with agent mode enabled
+        (hosts.json "agent": true, or AGENT_MODE=true for all hosts).
+        """
+        hosts = load_hosts() if hosts is None else hosts
+        if not hosts and AGENT_MODE:
+            hosts = [{"name": "local", "type": "local"}]
+        for host in hosts:
+            if not host.get("agent", AGENT_MODE) or host["name"] in self._streams:
+                continue
+            print(f"[Agent] Starting metrics stream for {host['name']}")
+            stream = AgentStream(host, self)
+            self._streams[host["name"]] = stream
+            stream.start()
+
+    def stop(self):
+        for stream in self._streams.values():
+            stream.stop()
+        self._streams.clear()
+
+    @property
+    def active_hosts(self) -> list:
+        return list(self._streams)
+
+hub = AgentHub()
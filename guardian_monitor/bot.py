@@ -1,14 +1,22 @@
 import os
+import time
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
 from dotenv import load_dotenv
-from guardian_monitor.graph import create_graph
+from guardian_monitor import perf, llm_router, incidents, checks
+from guardian_monitor.scheduler import scheduler, format_schedule
+from guardian_monitor.telegram_stream import StreamingReply
+from guardian_monitor.chat_tasks import tasks as chat_tasks
+from guardian_monitor.ssh_tools import load_hosts
 
 load_dotenv()
 
+# Edit a placeholder message with progress and tokens while the agent works
+CHAT_STREAMING = os.getenv("CHAT_STREAMING", "true").lower() in ("1", "true", "yes")
+
 # Global event for approval waiting
 approval_event = asyncio.Event()
 # Global state to store the user's decision
@@ -16,8 +24,22 @@ user_decision = False
 # Reference to the latest metrics for /status
 latest_metrics = {}
 
+def _authorized(update: Update) -> bool:
+    """
+    Only the configured TELEGRAM_CHAT_ID may use commands that touch hosts or their data.
+    """
+    return str(update.effective_chat.id) == str(os.getenv("TELEGRAM_CHAT_ID"))
+
+async def reply_block(update: Update, title: str, text: str):
+    """
+    Replies with a titled code block, truncated to the Telegram limit.
+    """
+    if len(text) > 3900:
+        text = text[:3900] + "\n...(truncated)"
+    await update.message.reply_text(f"{title}\n```\n{text}\n```", parse_mode="Markdown")
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("Guardian Bot Started! Use /status to check system.")
+    await update.message.reply_text("Guardian Bot Started! Use /status to check system, /perf for latencies, /incidents for past incidents, /schedule for sampling, /checks for health checks, /cancel to stop a request.")
 
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not latest_metrics:
@@ -29,6 +51,92 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg += f"- *{k}*: `{v}`\n"
     await update.message.reply_text(msg, parse_mode="Markdown")
 
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /perf [host] -> p50/p95/p99 latency by operation and host.
+    """
+    if not _authorized(update):
+        return
+    host = context.args[0] if context.args else None
+    await reply_block(update, "⏱️ *Performance*", perf.format_summary(host))
+
+async def incidents_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /incidents [host|fp=<fingerprint>|text] -> latest recorded incidents.
+    """
+    if not _authorized(update):
+        return
+    arg = " ".join(context.args).strip() if context.args else ""
+    if arg.startswith("fp="):
+        found = incidents.store.query(fp=arg[3:])
+    elif arg and any(h["name"].lower() == arg.lower() for h in load_hosts()):
+        found = incidents.store.query(host=arg)
+    else:
+        found = incidents.store.query(text=arg or None)
+    await reply_block(update, "📒 *Incidents*", incidents.format_incidents(found))
+
+async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /schedule -> sampling state and interval of every host (adaptive scheduler).
+    """
+    if not _authorized(update):
+        return
+    await reply_block(update, "🗓️ *Schedule*", format_schedule(scheduler.snapshot()))
+
+async def checks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /checks [name|host] -> runs the configured checks now and shows pass/fail.
+    """
+    if not _authorized(update):
+        return
+    arg = context.args[0] if context.args else None
+    is_host = arg and any(h["name"].lower() == arg.lower() for h in load_hosts())
+    loop = asyncio.get_running_loop()
+    name, target = (None, arg) if is_host else (arg, None)
+    results = await loop.run_in_executor(None, checks.engine.refresh, name, target)
+    await reply_block(update, "🩺 *Checks*", checks.format_results(results, name, target))
+
+async def notify_check_change(result, previous):
+    """
+    Telegram alert when a configured check starts failing or recovers.
+    """
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    if not chat_id:
+        return
+    if result.ok:
+        text = f"✅ *Recovered*: `{result.name}` on {result.target}\n{result.detail}"
+    else:
+        text = f"🚨 *Check failed*: `{result.name}` on {result.target}\n{result.detail}"
+    await send_safe_message(chat_id, text)
+
+async def notify_host_anomalies(host: str, anomalies: list, previous: list):
+    """
+    Telegram alert when the scheduler finds new anomalies on a host, or they clear.
+    """
+    chat_id = os.getenv("TELEGRAM_CHAT_ID")
+    if not chat_id:
+        return
+    if anomalies:
+        text = f"⚠️ *{host}*:\n" + "\n".join(f"- {a}" for a in anomalies)
+    else:
+        text = f"✅ *{host}*: back to normal"
+    await send_safe_message(chat_id, text)
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /cancel -> stops the running agent turn (and its commands) and drops queued ones.
+    """
+    if not _authorized(update):
+        return
+    running, dropped = chat_tasks.cancel(update.effective_chat.id)
+    if not running and not dropped:
+        await update.message.reply_text("Nothing to cancel.")
+        return
+    msg = "🛑 Cancelled the running request." if running else "🛑 Cancelled."
+    if dropped:
+        msg += f" Dropped {dropped} queued message(s)."
+    await update.message.reply_text(msg)
+
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global user_decision
     query = update.callback_query
@@ -108,6 +216,11 @@ def create_bot_app():
     app = ApplicationBuilder().token(token).connect_timeout(30.0).read_timeout(30.0).write_timeout(30.0).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("status", status))
+    app.add_handler(CommandHandler("perf", perf_command))
+    app.add_handler(CommandHandler("cancel", cancel_command))
+    app.add_handler(CommandHandler("incidents", incidents_command))
+    app.add_handler(CommandHandler("schedule", schedule_command))
+    app.add_handler(CommandHandler("checks", checks_command))
     app.add_handler(CallbackQueryHandler(button_handler))
     
     # Add Chat Handler
@@ -119,9 +232,26 @@ def create_bot_app():
     app.add_error_handler(error_handler)
 
     BotGlobals.app = app
-    BotGlobals.graph = create_graph()
+    # The chat graph (LangChain/LangGraph/Ollama) is built by warm_up() once polling runs
     return app
 
+async def warm_up():
+    """
+    Imports the LLM stack and builds the chat graph in the background, so
+    startup isn't blocked by it and the first chat turn doesn't pay for it.
+    """
+    def build():
+        from guardian_monitor.graph import get_graph
+        return get_graph("chat")
+    
+    start = time.perf_counter()
+    try:
+        BotGlobals.graph = await asyncio.get_running_loop().run_in_executor(None, build)
+        perf.record("startup.graph", "local", time.perf_counter() - start)
+        print(f"Chat agent ready ({time.perf_counter() - start:.1f}s)")
+    except Exception as e:
+        print(f"Warning: Chat agent warm-up failed: {e}")
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles natural language messages from the user.
@@ -141,36 +271,67 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         BotGlobals.manual_trigger.set()
         return
 
+    # One turn at a time per chat (shared memory thread); other chats run in parallel.
+    # The handler returns right away so /cancel and other chats are never blocked.
+    ahead = chat_tasks.submit(chat_id, lambda: run_chat_turn(context.bot, chat_id, user_message))
+    if ahead:
+        await update.message.reply_text(f"⏳ Queued (position {ahead}). Send /cancel to stop the current request.")
+
+async def run_chat_turn(tg_bot, chat_id, user_message: str):
+    """
+    Runs one agent turn for a chat message and delivers the answer.
+    """
+    # Usually already imported by warm_up()
+    from guardian_monitor.graph import ainvoke_chat
+    
     # Indicate typing
     # Indicate typing (non-blocking)
     try:
-        await context.bot.send_chat_action(chat_id=chat_id, action="typing")
+        await tg_bot.send_chat_action(chat_id=chat_id, action="typing")
     except Exception as e:
         print(f"Warning: Failed to send typing action: {e}")
     
+    reply = None
+    if CHAT_STREAMING:
+        reply = StreamingReply(tg_bot, chat_id)
+        await reply.start()
+    
     try:
-        if BotGlobals.graph is None:
-             BotGlobals.graph = create_graph()
-
-        print(f"Invoking Agent with: {user_message}")
+        # Routine turns go to the small fast model, the rest to the large one
+        route = llm_router.classify_turn(user_message)
+        print(f"Invoking Agent ({route}) with: {user_message}")
         # Invoke Graph with Thread ID (Memory)
         inputs = {"messages": [("user", user_message)]}
-        config = {"configurable": {"thread_id": str(chat_id)}}
+        config = {
+            "configurable": {"thread_id": str(chat_id)},
+            # Times every tool and LLM call made by the agent
+            "callbacks": [perf.PerfCallbackHandler()]
+        }
         
         # Use ainvoke with config
-        response = await BotGlobals.graph.ainvoke(inputs, config=config)
+        with perf.timed("chat.turn", route):
+            response = await ainvoke_chat(inputs, config, route, on_event=reply.handle_event if reply else None)
         
         # Get final message
         final_message = response["messages"][-1].content
         
-        await send_safe_message(chat_id, final_message)
+        if reply:
+            await reply.finish(final_message)
+        else:
+            await send_safe_message(chat_id, final_message)
         
-
+    except asyncio.CancelledError:
+        if reply and reply.message_id:
+            await reply.finish("🛑 Cancelled.")
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         print(f"Chat Error: {e}")
-        await update.message.reply_text(f"😴 My AI brain is offline right now. Error: {e}")
+        if reply and reply.message_id:
+            await reply.finish(f"😴 My AI brain is offline right now. Error: {e}")
+        else:
+            await send_safe_message(chat_id, f"😴 My AI brain is offline right now. Error: {e}")
 
 async def send_safe_message(chat_id: str, text: str, reply_markup=None):
     """
@@ -179,6 +340,8 @@ async def send_safe_message(chat_id: str, text: str, reply_markup=None):
     if not BotGlobals.app:
         return
 
+    start = time.perf_counter()
+    ok = True
     try:
         await BotGlobals.app.bot.send_message(
             chat_id=chat_id, 
@@ -196,7 +359,9 @@ async def send_safe_message(chat_id: str, text: str, reply_markup=None):
                 # No parse_mode
             )
         except Exception as e2:
+             ok = False
              print(f"Failed to send message: {e2}")
+    perf.record("telegram.send", "telegram", time.perf_counter() - start, ok)
 
 async def send_execution_result(command: str, result: str):
     """
@@ -0,0 +1,76 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+from guardian_monitor.ssh_tools import CancelScope, cancel_scope
+
+class ChatTaskManager:
+    """
+    Runs chat turns one at a time per chat (same thread_id checkpoint), while
+    different chats run in parallel. Each turn runs inside a CancelScope so
+    /cancel stops both the graph run and the commands it started.
+    """
+    def __init__(self):
+        self._pending = {}   # chat -> deque of job factories
+        self._workers = {}   # chat -> worker task
+        self._current = {}   # chat -> (job task, scope)
+
+    def queued(self, chat_id) -> int:
+        """
+        Turns waiting or running for this chat.
+        """
+        key = str(chat_id)
+        return len(self._pending.get(key, ())) + (1 if key in self._current else 0)
+
+    def submit(self, chat_id, job: Callable[[], Awaitable]) -> int:
+        """
+        Queues `job()` for this chat. Returns how many turns are ahead of it (0 = runs now).
+        """
+        key = str(chat_id)
+        ahead = self.queued(key)
+        self._pending.setdefault(key, deque()).append(job)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._worker(key))
+        return ahead
+
+    def cancel(self, chat_id) -> tuple:
+        """
+        Cancels the running turn and drops the queued ones.
+        Returns (running turn cancelled, number of queued turns dropped).
+        """
+        key = str(chat_id)
+        pending = self._pending.get(key)
+        dropped = len(pending) if pending else 0
+        if pending:
+            pending.clear()
+        current = self._current.get(key)
+        if current:
+            task, scope = current
+            scope.cancel()
+            task.cancel()
+        return bool(current), dropped
+
+    async def _worker(self, key: str):
+        pending = self._pending[key]
+        try:
+            while pending:
+                job = pending.popleft()
+                scope = CancelScope()
+                # The job task copies this context, so its commands land in the scope
+                with cancel_scope(scope):
+                    task = asyncio.create_task(job())
+                self._current[key] = (task, scope)
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    if not task.cancelled():
+                        raise
+                    print(f"Chat {key}: turn cancelled")
+                except Exception as e:
+                    print(f"Chat {key}: turn failed: {e}")
+                finally:
+                    self._current.pop(key, None)
+        finally:
+            self._workers.pop(key, None)
+            self._pending.pop(key, None)
+
+tasks = ChatTaskManager()
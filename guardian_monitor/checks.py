@@ -0,0 +1,385 @@
+import os
+import ssl
+import json
+import time
+import shlex
+import socket
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import urllib.error
+import urllib.request
+from urllib.parse import urlparse
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from guardian_monitor import perf
+from guardian_monitor.ssh_tools import run_command, resolve_hosts, _load_host_config, _is_error
+
+CHECKS_PATH = os.getenv("CHECKS_PATH", os.path.join(os.path.dirname(__file__), "config", "checks.json"))
+# Run the checks in the background (off unless enabled; /checks and run_checks work either way)
+CHECKS_ENABLED = os.getenv("CHECKS_ENABLED", "False").lower() == "true"
+# Probes running at the same time
+CHECKS_CONCURRENCY = int(os.getenv("CHECKS_CONCURRENCY", "8"))
+CHECK_DEFAULT_INTERVAL = float(os.getenv("CHECK_DEFAULT_INTERVAL", "60"))
+CHECK_DEFAULT_TIMEOUT = float(os.getenv("CHECK_DEFAULT_TIMEOUT", "5"))
+# +/- fraction of the interval, so checks of the fleet don't line up
+CHECK_JITTER = 0.1
+
+# config/checks.json (copy config/checks.example.json and adapt it):
+# {
+#   "defaults": {"interval": 60, "timeout": 5},
+#   "checks": [
+#     {"name": "nginx", "type": "systemd", "unit": "nginx", "hosts": "Senpai", "interval": 30},
+#     {"name": "ssh", "type": "tcp", "port": 22, "hosts": "remotos"},
+#     {"name": "web", "type": "http", "url": "https://example.org/health", "status": 200, "max_latency_ms": 1500},
+#     {"name": "web-cert", "type": "cert", "address": "example.org", "port": 443, "warn_days": 14},
+#     {"name": "postgres", "type": "container", "container": "postgres", "hosts": "tag:docker"},
+#     {"name": "cron", "type": "process", "process": "cron", "hosts": "all"}
+#   ]
+# }
+# systemd/container/process run a command on each host; tcp connects from here to
+# each host's ip (or "address"); http and cert probe one endpoint from here.
+
+@dataclass
+class CheckResult:
+    name: str
+    type: str
+    target: str              # host name, or the endpoint for http/cert
+    ok: bool
+    detail: str
+    latency_ms: float = 0.0
+    checked_at: float = 0.0
+
+@dataclass
+class Probe:
+    """
+    One check against one target, with its own interval and cached result.
+    """
+    check: dict
+    target: str
+    interval: float
+    timeout: float
+    result: Optional[CheckResult] = None
+    next_run: float = 0.0
+
+    @property
+    def key(self) -> tuple:
+        return (self.check["name"], self.target)
+
+def _host_address(host: str) -> str:
+    config = _load_host_config(host) or {}
+    return config.get("ip") or "127.0.0.1"
+
+def _remote(cmd: str, host: str) -> str:
+    """
+    First line of a command's output on a host; ConnectionError if it couldn't run.
+    """
+    output = run_command(cmd, host)
+    if _is_error(output):
+        raise ConnectionError(output.splitlines()[0] if output else "no output")
+    lines = output.strip().splitlines()
+    return lines[0].strip() if lines else ""
+
+def check_systemd(check: dict, target: str, timeout: float):
+    unit = check["unit"]
+    # is-active exits non-zero for inactive units; the state is on stdout either way
+    state = _remote(f"systemctl is-active {shlex.quote(unit)} 2>&1 || true", target)
+    return state == "active", f"{unit} is {state or 'unknown'}"
+
+def check_process(check: dict, target: str, timeout: float):
+    name = check["process"]
+    flag = "-f" if check.get("full") else "-x"
+    count = _remote(f"pgrep -c {flag} {shlex.quote(name)} || true", target)
+    running = int(count) if count.isdigit() else 0
+    minimum = int(check.get("min", 1))
+    return running >= minimum, f"{running} '{name}' process(es) running (min {minimum})"
+
+def check_container(check: dict, target: str, timeout: float):
+    name = check["container"]
+    fmt = "{{.State.Status}}{{if .State.Health}} {{.State.Health.Status}}{{end}}"
+    state = _remote(f"docker inspect -f {shlex.quote(fmt)} {shlex.quote(name)} 2>&1 || true", target)
+    if "No such" in state:
+        return False, f"container {name} not found"
+    status, _, health = state.partition(" ")
+    ok = status == "running" and health in ("", "healthy")
+    return ok, f"container {name} is {state}"
+
+def check_tcp(check: dict, target: str, timeout: float):
+    address = check.get("address") or _host_address(target)
+    port = int(check["port"])
+    try:
+        with socket.create_connection((address, port), timeout=timeout):
+            return True, f"{address}:{port} open"
+    except OSError as e:
+        return False, f"{address}:{port} unreachable ({e.strerror or e})"
+
+def check_http(check: dict, target: str, timeout: float):
+    url = check["url"]
+    expected = check.get("status", 200)
+    expected = expected if isinstance(expected, list) else [expected]
+    start = time.perf_counter()
+    try:
+        req = urllib.request.Request(url, method=check.get("method", "GET"))
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, body = resp.status, resp.read(65536) if check.get("contains") else b""
+    except urllib.error.HTTPError as e:
+        status, body = e.code, b""
+    except (urllib.error.URLError, OSError) as e:
+        return False, f"{url} unreachable ({getattr(e, 'reason', e)})"
+    elapsed = (time.perf_counter() - start) * 1000
+    if status not in expected:
+        return False, f"{url} returned {status} (expected {', '.join(map(str, expected))})"
+    if check.get("contains") and check["contains"].encode() not in body:
+        return False, f"{url} body does not contain '{check['contains']}'"
+    max_latency = check.get("max_latency_ms")
+    if max_latency and elapsed > max_latency:
+        return False, f"{url} slow: {elapsed:.0f}ms (max {max_latency}ms)"
+    return True, f"{url} {status} in {elapsed:.0f}ms"
+
+def check_cert(check: dict, target: str, timeout: float):
+    address = check.get("address") or urlparse(check.get("url", "")).hostname
+    port = int(check.get("port", 443))
+    warn_days = float(check.get("warn_days", 14))
+    context = ssl.create_default_context()
+    try:
+        with socket.create_connection((address, port), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=address) as tls:
+                cert = tls.getpeercert()
+    except ssl.SSLCertVerificationError as e:
+        return False, f"{address}:{port} certificate invalid ({e.verify_message})"
+    except OSError as e:
+        return False, f"{address}:{port} unreachable ({e.strerror or e})"
+    days = (ssl.cert_time_to_seconds(cert["notAfter"]) - time.time()) / 86400
+    if days < warn_days:
+        return False, f"{address} certificate expires in {days:.0f} days ({cert['notAfter']})"
+    return True, f"{address} certificate valid for {days:.0f} days"
+
+CHECK_TYPES: Dict[str, Callable] = {
+    "systemd": check_systemd,
+    "tcp": check_tcp,
+    "http": check_http,
+    "cert": check_cert,
+    "container": check_container,
+    "process": check_process,
+}
+# Types probed from the guardian itself against one endpoint (no "hosts")
+ENDPOINT_TYPES = ("http", "cert")
+# Keys each type needs; for cert either of them
+REQUIRED_KEYS = {
+    "systemd": ("unit",),
+    "tcp": ("port",),
+    "http": ("url",),
+    "cert": (("address", "url"),),
+    "container": ("container",),
+    "process": ("process",),
+}
+
+def _missing_keys(check: dict) -> List[str]:
+    missing = []
+    for key in REQUIRED_KEYS[check["type"]]:
+        options = key if isinstance(key, tuple) else (key,)
+        if not any(check.get(k) not in (None, "") for k in options):
+            missing.append(" or ".join(options))
+    return missing
+
+def load_checks(path: str = CHECKS_PATH) -> List[Probe]:
+    """
+    Expands config/checks.json into one Probe per check and target host.
+    Invalid checks are reported and skipped.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r") as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"Error reading checks.json: {e}")
+        return []
+
+    defaults = config.get("defaults", {})
+    probes = []
+    for check in config.get("checks", []):
+        kind, name = check.get("type"), check.get("name")
+        if kind not in CHECK_TYPES or not name:
+            print(f"Skipping check {name or check}: unknown type '{kind}'")
+            continue
+        missing = _missing_keys(check)
+        if missing:
+            print(f"Skipping check {name}: missing {', '.join(missing)}")
+            continue
+        try:
+            if kind in ENDPOINT_TYPES:
+                targets = [check["url"]] if check.get("url") else [f"{check['address']}:{check.get('port', 443)}"]
+            else:
+                targets = resolve_hosts(check.get("hosts", "local"))
+        except ValueError as e:
+            print(f"Skipping check {name}: {e}")
+            continue
+        interval = float(check.get("interval", defaults.get("interval", CHECK_DEFAULT_INTERVAL)))
+        timeout = float(check.get("timeout", defaults.get("timeout", CHECK_DEFAULT_TIMEOUT)))
+        probes.extend(Probe(check=check, target=t, interval=interval, timeout=timeout) for t in targets)
+    return probes
+
+def run_probe(probe: Probe) -> CheckResult:
+    """
+    Runs one probe (blocking). A host that can't be reached counts as a failure.
+    """
+    check = probe.check
+    start = time.perf_counter()
+    try:
+        ok, detail = CHECK_TYPES[check["type"]](check, probe.target, probe.timeout)
+    except ConnectionError as e:
+        ok, detail = False, str(e)[:200]
+    except Exception as e:
+        ok, detail = False, f"check error: {str(e)[:200]}"
+    elapsed = time.perf_counter() - start
+    perf.record(f"check.{check['type']}", probe.target, elapsed, ok=ok)
+    return CheckResult(
+        name=check["name"], type=check["type"], target=probe.target, ok=ok, detail=detail,
+        latency_ms=round(elapsed * 1000, 1), checked_at=time.time()
+    )
+
+class ChecksEngine:
+    """
+    Runs the configured checks concurrently, each on its own interval, and
+    caches the latest result per (check, target). Failures are exposed as
+    anomalies for monitor_node.
+    """
+    def __init__(self, path: str = CHECKS_PATH, concurrency: int = CHECKS_CONCURRENCY):
+        self.path = path
+        self.concurrency = concurrency
+        self.probes: Dict[tuple, Probe] = {}
+        self.on_change = None    # async callable(result, previous) on ok <-> failed transitions
+        self._tasks: List[asyncio.Task] = []
+        self._sem = None
+        self._main_loop = None   # loop the alerts are sent from (set by start)
+        # _record runs on the event loop (background probes) and in refresh's worker threads
+        self._record_lock = threading.Lock()
+
+    def load(self) -> int:
+        self.probes = {p.key: p for p in load_checks(self.path)}
+        return len(self.probes)
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(max(1, self.concurrency))
+        return self._sem
+
+    def _record(self, probe: Probe, result: CheckResult) -> tuple:
+        """
+        Stores a probe result and schedules its next run. Returns (changed, previous):
+        changed is True for a first failure or an ok <-> failed transition.
+        """
+        with self._record_lock:
+            previous, probe.result = probe.result, result
+            probe.next_run = time.monotonic() + probe.interval * random.uniform(1 - CHECK_JITTER, 1 + CHECK_JITTER)
+            changed = (previous is None and not result.ok) or (previous is not None and previous.ok != result.ok)
+        if changed:
+            print(f"Check {result.name} on {result.target}: {'OK' if result.ok else 'FAILED'} - {result.detail}")
+        return changed, previous
+
+    async def _notify(self, result: CheckResult, previous: Optional[CheckResult]):
+        if not self.on_change:
+            return
+        try:
+            await self.on_change(result, previous)
+        except Exception as e:
+            print(f"Check notification failed: {e}")
+
+    async def _run(self, probe: Probe) -> CheckResult:
+        loop = asyncio.get_running_loop()
+        async with self._semaphore():
+            result = await loop.run_in_executor(None, contextvars.copy_context().run, run_probe, probe)
+        changed, previous = self._record(probe, result)
+        if changed:
+            await self._notify(result, previous)
+        return result
+
+    async def run_all(self, force: bool = False) -> List[CheckResult]:
+        """
+        Runs the checks that are due (all of them with force=True) concurrently
+        and returns every cached result.
+        """
+        if not self.probes:
+            self.load()
+        now = time.monotonic()
+        due = [p for p in self.probes.values() if force or p.result is None or p.next_run <= now]
+        await asyncio.gather(*(self._run(p) for p in due))
+        return self.results()
+
+    def refresh(self, name: str = None, target: str = None) -> List[CheckResult]:
+        """
+        Runs the matching checks now from a worker thread (e.g. a chat tool
+        call outside the main event loop) and returns their results.
+        """
+        if not self.probes:
+            self.load()
+        selected = [
+            p for p in self.probes.values()
+            if (not name or p.check["name"].lower() == name.lower())
+            and (not target or p.target.lower() == target.lower())
+        ]
+        if not selected:
+            return []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(selected)))) as pool:
+            # Each probe carries the caller's context, so /cancel's scope reaches its SSH commands
+            futures = [pool.submit(contextvars.copy_context().run, run_probe, p) for p in selected]
+            results = [f.result() for f in futures]
+        for probe, result in zip(selected, results):
+            # Same transition/alert handling as the background loop, so an on-demand run
+            # that sees a failure first doesn't swallow its alert
+            changed, previous = self._record(probe, result)
+            if changed and self._main_loop and not self._main_loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self._notify(result, previous), self._main_loop)
+        return results
+
+    async def _loop(self, probe: Probe):
+        # First runs spread over a few seconds
+        await asyncio.sleep(random.uniform(0, min(probe.interval, 5.0)))
+        while True:
+            if probe.next_run <= time.monotonic():
+                await self._run(probe)
+            await asyncio.sleep(max(0.0, probe.next_run - time.monotonic()))
+
+    def start(self) -> int:
+        """
+        Starts one background loop per probe. Returns the number of probes.
+        """
+        if self._tasks or not self.load():
+            return len(self.probes)
+        self._main_loop = asyncio.get_running_loop()
+        self._tasks = [asyncio.create_task(self._loop(p)) for p in self.probes.values()]
+        print(f"Checks engine running {len(self._tasks)} probe(s)")
+        return len(self._tasks)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def results(self) -> List[CheckResult]:
+        return [p.result for p in self.probes.values() if p.result]
+
+    def anomalies(self) -> List[str]:
+        return [f"Check '{r.name}' failed on {r.target}: {r.detail}" for r in self.results() if not r.ok]
+
+def format_results(results: List[CheckResult], name: str = None, target: str = None) -> str:
+    """
+    name/target: the filter the results were selected with, if any.
+    """
+    if not results and (name or target):
+        return f"No check matches check='{name or ''}' target_host='{target or ''}'."
+    if not results:
+        return "No checks configured (config/checks.json)."
+    lines = []
+    for r in sorted(results, key=lambda r: (r.ok, r.name, r.target)):
+        age = time.time() - r.checked_at
+        lines.append(f"{'✓' if r.ok else '✗'} {r.name} [{r.target}] {r.detail} ({r.latency_ms:.0f}ms, {age:.0f}s ago)")
+    failed = sum(not r.ok for r in results)
+    lines.append(f"\n{len(results) - failed}/{len(results)} passing")
+    return "\n".join(lines)
+
+engine = ChecksEngine()
@@ -0,0 +1,180 @@
+import os
+import re
+from typing import List, Optional
+
+# Rough size of a token for budgeting (llama-style tokenizers on shell output)
+CHARS_PER_TOKEN = 4
+# Share of the budget kept from the start of the output; the rest comes from the end,
+# where errors and the latest log lines usually are
+HEAD_SHARE = 0.35
+
+# Token budget per tool result (override with COMPACT_TOKENS_<TOOL>, e.g. COMPACT_TOKENS_READ_SYSTEM_LOGS=3000)
+DEFAULT_BUDGETS = {
+    "execute_terminal_command": 1500,
+    "execute_on_hosts": 2000,
+    "read_system_logs": 2000,
+    "web_search": 800,
+    "run_checks": 1000,
+    # One investigation step as replayed to the diagnosis prompt
+    "history": 250,
+}
+DEFAULT_BUDGET = int(os.getenv("COMPACT_TOKENS_DEFAULT", "1500"))
+
+_ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(\x07|\x1b\\)|\x1b[@-Z\\-_]")
+_CTRL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+# Leading log timestamp (ISO, syslog or dmesg) and the pid in "proc[1234]:". Log lines
+# that differ only in these are "similar"; any other difference (values, devices) is kept
+_LOG_TIME_RE = re.compile(
+    r"^(\d{4}-\d\d-\d\d[T ][\d:.,]+(Z|[+-]\d\d:?\d\d)?|[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d|\[\s*\d+\.\d+\])\s"
+)
+_LOG_PID_RE = re.compile(r"^(\S+\s+){0,2}?[\w.@/-]+\[\d+\]:")
+# Multi-word column headers of ps/df/ss/netstat/docker, joined so the header splits like the rows
+_HEADER_WORDS_RE = re.compile(r"\b(Mounted on|Local Address|Foreign Address|Peer Address|CONTAINER ID)")
+# Column names of the tables compact_table rewrites (ps, top, df, ss, netstat, docker, lsof)
+KNOWN_COLUMNS = {
+    "pid", "ppid", "user", "%cpu", "%mem", "vsz", "rss", "tty", "stat", "start", "time", "command", "cmd",
+    "filesystem", "type", "size", "used", "avail", "available", "use%", "iused", "ifree", "iuse%", "mounted_on",
+    "capacity", "netid", "state", "recv-q", "send-q", "local_address",
+    "peer_address", "foreign_address", "process", "proto", "pid/program", "container_id", "image", "created",
+    "status", "ports", "names", "fd", "device", "node", "name"
+}
+
+def budget_for(tool: str) -> int:
+    env = os.getenv(f"COMPACT_TOKENS_{tool.upper()}")
+    return int(env) if env else DEFAULT_BUDGETS.get(tool, DEFAULT_BUDGET)
+
+def strip_noise(text: str) -> str:
+    """
+    Removes ANSI escapes and control characters, resolves carriage-return
+    progress updates (keeps the last one), drops trailing spaces and runs of blank lines.
+    """
+    text = _ANSI_RE.sub("", text.replace("\r\n", "\n"))
+    lines = []
+    for line in text.split("\n"):
+        if "\r" in line:
+            line = line.rsplit("\r", 1)[-1] or line.strip("\r")
+        line = _CTRL_RE.sub("", line).rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip("\n")
+
+def _similar_key(line: str) -> str:
+    # Only the log prefix is noise: "Oct 18 10:00:01 host sshd[812]: msg" ~ "Oct 18 10:00:07 host sshd[933]: msg"
+    key = _LOG_TIME_RE.sub("", line, count=1)
+    if key != line:
+        key = _LOG_PID_RE.sub(lambda m: re.sub(r"\[\d+\]:$", "[#]:", m.group(0)), key, count=1)
+    return key
+
+def collapse_repeats(lines: List[str]) -> List[str]:
+    """
+    Runs of identical lines become the line plus a count. Runs of log lines
+    that only differ in their timestamp/pid prefix keep their first and last line.
+    """
+    out = []
+    run = []
+    def flush():
+        if len(run) == 1:
+            out.append(run[0])
+        elif all(l == run[0] for l in run):
+            out.extend([run[0], f"  [×{len(run) - 1} more identical]"])
+        else:
+            out.append(run[0])
+            if len(run) > 2:
+                out.append(f"  [×{len(run) - 2} more similar]")
+            out.append(run[-1])
+    for line in lines:
+        if run and line.strip() and _similar_key(line) == _similar_key(run[-1]):
+            run.append(line)
+            continue
+        if run:
+            flush()
+        run = [line]
+    if run:
+        flush()
+    return out
+
+def _split_row(line: str, ncols: int) -> List[str]:
+    # The last column (COMMAND, Mounted_on, Process...) may contain spaces, or be empty
+    row = line.split(None, ncols - 1)
+    return row + [""] if len(row) == ncols - 1 else row
+
+def compact_table(lines: List[str]) -> Optional[List[str]]:
+    """
+    Whitespace-aligned tables of known commands (ps, df, ss, netstat, docker ps...)
+    as 'a|b|c' rows; columns with the same value in every row are hoisted into one line.
+    Returns None if the lines don't look like a table.
+    """
+    for start in range(min(3, len(lines))):
+        # ss glues its last two headers when Process is empty: "Peer Address:PortProcess"
+        header_line = lines[start].replace(":PortProcess", ":Port Process")
+        header = _HEADER_WORDS_RE.sub(lambda m: m.group(0).replace(" ", "_"), header_line).split()
+        rows = [l for l in lines[start + 1:] if l.strip()]
+        ncols = len(header)
+        if ncols < 3 or len(rows) < 2 or any(h[0].isdigit() for h in header):
+            continue
+        # Only known command tables: prose or "Core 0: +45.0°C" lines split into words too
+        known = sum(h.lower().split(":")[0] in KNOWN_COLUMNS for h in header)
+        if known < max(2, ncols // 2):
+            continue
+        split = [_split_row(r, ncols) for r in rows]
+        fitting = sum(len(r) == ncols for r in split)
+        if fitting < 0.8 * len(rows):
+            continue
+
+        table = [r for r in split if len(r) == ncols]
+        constant = [i for i in range(ncols - 1) if len(table) >= 3 and len({r[i] for r in table}) == 1]
+        keep = [i for i in range(ncols) if i not in constant]
+        out = lines[:start]
+        if constant:
+            out.append("[all rows] " + " ".join(f"{header[i]}={table[0][i]}" for i in constant))
+        out.append("|".join(header[i] for i in keep))
+        for r in split:
+            out.append("|".join(r[i] for i in keep) if len(r) == ncols else " ".join(r))
+        return out
+    return None
+
+def head_tail(text: str, max_chars: int) -> str:
+    """
+    Keeps the start and (mostly) the end of the text, cut at line boundaries.
+    """
+    if len(text) <= max_chars:
+        return text
+    lines = text.split("\n")
+    head_budget = int(max_chars * HEAD_SHARE)
+    tail_budget = max_chars - head_budget
+
+    head, size = [], 0
+    for line in lines:
+        if size + len(line) + 1 > head_budget:
+            break
+        head.append(line)
+        size += len(line) + 1
+    tail, size = [], 0
+    for line in reversed(lines[len(head):]):
+        if size + len(line) + 1 > tail_budget:
+            break
+        tail.append(line)
+        size += len(line) + 1
+    tail.reverse()
+
+    omitted = lines[len(head):len(lines) - len(tail)]
+    if not head and not tail:
+        # One huge line: cut by characters
+        return text[:head_budget] + f" …[{len(text) - max_chars} chars omitted]… " + text[-tail_budget:]
+    marker = f"…[{len(omitted)} lines / {sum(len(l) + 1 for l in omitted)} chars omitted]…"
+    return "\n".join(head + [marker] + tail)
+
+def compact_output(text: str, tool: str = None, max_tokens: int = None) -> str:
+    """
+    Shrinks a tool result before it reaches the LLM: strip noise, compact
+    tables, collapse repeated lines, then fit the tool's token budget
+    keeping head and tail.
+    """
+    if not text:
+        return text
+    text = strip_noise(text)
+    lines = text.split("\n")
+    table = compact_table(lines)
+    lines = table if table is not None else collapse_repeats(lines)
+    max_tokens = max_tokens or budget_for(tool or "")
+    return head_tail("\n".join(lines), max_tokens * CHARS_PER_TOKEN)
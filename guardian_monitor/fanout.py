@@ -0,0 +1,72 @@
+import os
+import asyncio
+import difflib
+import contextvars
+from typing import Dict, List
+from guardian_monitor.ssh_tools import run_command, _is_error
+
+# Hosts a fan-out command runs on at the same time
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+# Overall limit per host (the command keeps running in its thread, its result is dropped)
+FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "60"))
+# Output lines shown per group / diff lines per differing group
+FANOUT_MAX_LINES = int(os.getenv("FANOUT_MAX_LINES", "30"))
+FANOUT_MAX_DIFF_LINES = int(os.getenv("FANOUT_MAX_DIFF_LINES", "20"))
+
+async def run_on_hosts(command: str, hosts: List[str], concurrency: int = FANOUT_CONCURRENCY,
+                       timeout: float = FANOUT_TIMEOUT) -> Dict[str, str]:
+    """
+    Runs `command` on every host, at most `concurrency` at a time.
+    Returns {host: output}, in the order of `hosts`.
+    """
+    loop = asyncio.get_event_loop()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    
+    async def run(host):
+        async with sem:
+            try:
+                # Copy the context so the chat's cancel scope reaches the worker thread
+                return await asyncio.wait_for(
+                    loop.run_in_executor(None, contextvars.copy_context().run, run_command, command, host), timeout
+                )
+            except asyncio.TimeoutError:
+                return f"Error: timed out after {timeout:g}s"
+    
+    outputs = await asyncio.gather(*(run(h) for h in hosts))
+    return dict(zip(hosts, outputs))
+
+def _clip(lines: List[str], limit: int) -> List[str]:
+    if len(lines) <= limit:
+        return lines
+    return lines[:limit] + [f"... ({len(lines) - limit} more lines)"]
+
+def aggregate(command: str, results: Dict[str, str]) -> str:
+    """
+    Groups hosts with identical output. The largest successful group is shown in
+    full; other outputs are shown as a diff against it, failures on their own.
+    """
+    groups: Dict[str, List[str]] = {}
+    for host, output in results.items():
+        groups.setdefault(output.strip(), []).append(host)
+    
+    ordered = sorted(groups.items(), key=lambda kv: (_is_error(kv[0]), -len(kv[1])))
+    failed = sum(len(h) for out, h in ordered if _is_error(out))
+    baseline, baseline_hosts = next(((out, h) for out, h in ordered if not _is_error(out)), (None, []))
+    
+    lines = [f"[FAN-OUT: `{command}` on {len(results)} hosts | {len(groups)} distinct outputs | {failed} failed]"]
+    for output, hosts in ordered:
+        names = ", ".join(hosts)
+        if _is_error(output):
+            lines.append(f"== FAILED on {names} ==")
+            lines.extend(_clip(output.splitlines() or ["(no output)"], 5))
+        elif output == baseline:
+            lines.append(f"== {names} ({len(hosts)}) ==")
+            lines.extend(_clip(output.splitlines() or ["(no output)"], FANOUT_MAX_LINES))
+        else:
+            lines.append(f"== {names} ({len(hosts)}): differs ==")
+            diff = difflib.unified_diff(
+                baseline.splitlines(), output.splitlines(), fromfile=baseline_hosts[0], tofile=hosts[0], lineterm="", n=0
+            )
+            # Skip the ---/+++ header, keep hunks
+            lines.extend(_clip([l for l in diff if not l.startswith(("---", "+++"))], FANOUT_MAX_DIFF_LINES))
+    return "\n".join(lines)
@@ -1,20 +1,22 @@
 import os
 import json
-from langchain_ollama import ChatOllama
+import asyncio
+from langchain_core.messages import RemoveMessage, ToolMessage
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
-from langgraph.checkpoint.memory import MemorySaver
-from guardian_monitor.tools import get_system_metrics, web_search, execute_terminal_command, save_knowledge, read_system_logs
+from guardian_monitor import llm_router
+from guardian_monitor.tools import get_system_metrics, web_search, execute_terminal_command, save_knowledge, read_system_logs, get_process_activity, search_incidents, execute_on_hosts, run_checks
+
+# Conversation memory shared by every route/endpoint graph, so a thread keeps
+# its history whichever model answers a given turn
+MEMORY = MemorySaver()
 
-def create_graph():
+def create_graph(route: str = "chat", base_url: str = None):
     """
-    Creates the ReAct agent graph.
+    Creates the ReAct agent graph for a model route (see llm_router.route_config).
     """
     # LLM Setup
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://10.29.93.56:11434")
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
-    
-    llm = ChatOllama(model=ollama_model, base_url=ollama_base_url, temperature=0.7)
+    llm = llm_router.get_llm(route, base_url)
     
     # Tools
     tools = [get_system_metrics, web_search, execute_terminal_command]
@@ -26,7 +28,12 @@ def create_graph():
         if os.path.exists(hosts_config_path):
             with open(hosts_config_path, 'r') as f:
                 data = json.load(f)
-                available_hosts = [f"- {h['name']}: {h.get('description', '')} ({h.get('ip', 'local')})" for h in data.get("hosts", [])]
+                available_hosts = [
+                    f"- {h['name']}: {h.get('description', '')} ({h.get('ip', 'local')})"
+                    + (f" [tags: {', '.join(h['tags'])}]" if h.get("tags") else "")
+                    for h in data.get("hosts", [])
+                ]
+                available_hosts += [f"- Grupo '{g}': {', '.join(members)}" for g, members in data.get("groups", {}).items()]
     except Exception as e:
         print(f"Error loading hosts.json: {e}")
     
@@ -43,7 +50,7 @@ def create_graph():
         print(f"Error loading knowledge config: {e}")
         
     # Update Tools List
-    tools = [get_system_metrics, web_search, execute_terminal_command, save_knowledge, read_system_logs]
+    tools = [get_system_metrics, web_search, execute_terminal_command, save_knowledge, read_system_logs, get_process_activity, search_incidents, execute_on_hosts, run_checks]
 
     # System Prompt
     system_prompt = f"""Eres 'GuardMonBot', un Agente Experto en Linux y SysAdmin.
@@ -63,6 +70,11 @@ def create_graph():
     2. execute_terminal_command: Para ejecutar comandos (ls, cat, ip, etc).
         - PELIGRO: NUNCA ejecutes comandos destructivos (rm, kill, restart) SIN PEDIR PERMISO EXPLÍCITO.
     3. web_search: Para buscar errores desconocidos.
+    4. get_process_activity: Procesos que más CPU/RAM consumen o cuya memoria crece (sort_by='growth') para detectar fugas.
+    5. search_incidents: Incidentes pasados (diagnóstico, comandos y resultado). Consúltala antes de investigar un problema que pudo ocurrir antes.
+    6. execute_on_hosts: Ejecuta el MISMO comando en varios servidores a la vez (hosts='all', un grupo, un tag o 'Nage,Senpai').
+        - Úsala en lugar de llamar execute_terminal_command una vez por servidor. Agrupa salidas idénticas y muestra las diferencias.
+    7. run_checks: Chequeos configurados (servicios systemd, puertos, endpoints HTTP, certificados, contenedores, procesos). Úsala primero si algo parece caído.
     
     MODO PLANIFICADOR INTERACTIVO:
     Si el usuario pide una tarea compleja (ej: "Limpiar disco", "Arreglar Nginx", "Liberar espacio"):
@@ -89,7 +101,99 @@ def create_graph():
     """
     
     # Create ReAct Agent (Agent -> Tools -> Agent) with Memory
-    memory = MemorySaver()
-    graph = create_react_agent(llm, tools, prompt=system_prompt, checkpointer=memory)
+    graph = create_react_agent(llm, tools, prompt=system_prompt, checkpointer=MEMORY)
     
     return graph
+
+_graphs = {}
+
+def get_graph(route: str = "chat", base_url: str = None):
+    """
+    Cached graph per (route, endpoint).
+    """
+    base_url = base_url or llm_router.endpoints()[0]
+    key = (route, base_url)
+    if key not in _graphs:
+        _graphs[key] = create_graph(route, base_url)
+    return _graphs[key]
+
+async def _discard_turn(graph, config, keep: int, keep_tool_results: bool = False) -> bool:
+    """
+    Removes the messages a failed/low-confidence attempt added to the thread,
+    so the escalated run starts from the same history.
+    
+    With keep_tool_results, the messages up to the last tool result stay (those
+    commands already ran and must not run again) and True is returned if any did.
+    """
+    state = await graph.aget_state(config)
+    added = state.values.get("messages", [])[keep:] if state and state.values else []
+    cut = 0
+    if keep_tool_results:
+        cut = max((i + 1 for i, m in enumerate(added) if isinstance(m, ToolMessage)), default=0)
+    if added[cut:]:
+        # as_node="tools": the update must not go through the agent's routing edge,
+        # which would fail on a thread left with no messages
+        await graph.aupdate_state(config, {"messages": [RemoveMessage(id=m.id) for m in added[cut:]]}, as_node="tools")
+    return cut > 0
+
+async def _run_graph(graph, inputs: dict, config: dict, on_event=None) -> dict:
+    if on_event is None:
+        return await graph.ainvoke(inputs, config=config)
+    
+    # Stream intermediate steps (tool calls, tokens) to the caller
+    async for event in graph.astream_events(inputs, config=config, version="v2"):
+        await on_event(event)
+    state = await graph.aget_state(config)
+    return state.values
+
+async def ainvoke_chat(inputs: dict, config: dict, route: str = "chat", on_event=None) -> dict:
+    """
+    Runs one chat turn on the routed model under the route timeout.
+    Fails over between Ollama endpoints, and escalates 'fast' turns to the
+    large model when they time out, fail or answer with low confidence.
+    Tool results of a dropped attempt are kept, so the retry continues from
+    them instead of running the same commands again.
+    
+    If `on_event` (async callable) is given, the turn is run with astream_events
+    and every event is forwarded to it; retries emit {"event": "on_route_retry"}.
+    """
+    attempts = [route] if route != "fast" else ["fast", "chat"]
+    last_error = None
+    
+    for attempt_route in attempts:
+        timeout = llm_router.route_config(attempt_route)["timeout"]
+        for base_url in llm_router.endpoints():
+            graph = get_graph(attempt_route, base_url)
+            before = await graph.aget_state(config)
+            keep = len(before.values.get("messages", [])) if before and before.values else 0
+            if on_event and (last_error or attempt_route != attempts[0]):
+                await on_event({"event": "on_route_retry", "data": {"route": attempt_route, "endpoint": base_url}})
+            try:
+                response = await asyncio.wait_for(_run_graph(graph, inputs, config, on_event), timeout)
+            except asyncio.CancelledError:
+                # /cancel: drop the half-done turn (e.g. tool calls without results) from memory
+                await _discard_turn(graph, config, keep)
+                raise
+            except llm_router.failover_errors() as e:
+                last_error = e
+                print(f"Chat turn failed on {base_url} ({attempt_route}): {e!r}")
+                if await _discard_turn(graph, config, keep, keep_tool_results=True):
+                    # Tools already ran: the next attempt continues from their results
+                    inputs = {"messages": []}
+                if not isinstance(e, asyncio.TimeoutError):
+                    llm_router.mark_failed(base_url)
+                    continue
+                # Timeout: the model is slow, not the endpoint -> escalate instead of retrying
+                break
+            
+            answer = response["messages"][-1].content if response.get("messages") else ""
+            if attempt_route == "fast" and llm_router.is_low_confidence(answer):
+                print("Fast model answer has low confidence, escalating to the large model.")
+                # Only the answer is dropped: the large model picks up from the tool results
+                if await _discard_turn(graph, config, keep, keep_tool_results=True):
+                    inputs = {"messages": []}
+                last_error = None
+                break
+            return response
+    
+    raise last_error or RuntimeError("No LLM route could answer")
@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import time
+import bisect
+import hashlib
+import secrets
+import threading
+from typing import Dict, List, Optional
+from guardian_monitor.metrics import format_net
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+INCIDENTS_PATH = os.getenv("INCIDENTS_PATH", os.path.join(DATA_DIR, "incidents.jsonl"))
+# Command output kept per execute step (the LLM sees it compacted, see compact.py)
+INCIDENT_OUTPUT_MAX = int(os.getenv("INCIDENT_OUTPUT_MAX", "2000"))
+
+# One JSON line per pipeline step, short keys:
+#   i: incident id, t: unix time, s: step (open|diagnose|review|execute|close), ms: step duration
+#   open:     h host, fp fingerprint, a anomalies, m metrics
+#   diagnose: d diagnosis, p proposed action, k action type, raw LLM output
+#   review:   ok approved, by auto|human|cli
+#   execute:  cmd, out, err (failed), nms Telegram notification time
+#   close:    r reason (finish|rejected), n steps
+
+# Metrics that are derived from others and rebuilt on load
+_DERIVED_METRICS = ("net_stats",)
+
+_NUM_RE = re.compile(r"\d+(\.\d+)?")
+
+def fingerprint(anomalies: List[str]) -> str:
+    """
+    Same anomalies with different numbers ("High CPU Usage: 93%" vs "97%") share a fingerprint.
+    """
+    canon = sorted({_NUM_RE.sub("#", a.strip().lower()) for a in anomalies or []})
+    return hashlib.sha1("\n".join(canon).encode()).hexdigest()[:12]
+
+class IncidentStore:
+    """
+    Append-only JSONL incident log with an in-memory index by host, time and
+    fingerprint. Full records are read back from disk by offset.
+    """
+    def __init__(self, path: str = INCIDENTS_PATH):
+        self.path = path
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._incidents: Dict[str, dict] = {}    # id -> summary (+ record offsets)
+        self._by_host: Dict[str, List[str]] = {}
+        self._by_fp: Dict[str, List[str]] = {}
+        self._times: List[tuple] = []            # (started, id), append order == time order
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            for line in f:
+                try:
+                    self._index(json.loads(line), offset)
+                except ValueError:
+                    # Torn last line after a crash: skip it
+                    pass
+                offset += len(line)
+
+    def _index(self, rec: dict, offset: int):
+        iid, step = rec.get("i"), rec.get("s")
+        if step == "open":
+            summary = {
+                "id": iid, "host": rec.get("h", "local"), "fp": rec.get("fp", ""),
+                "started": rec.get("t", 0), "anomalies": rec.get("a", []),
+                "diagnosis": "", "actions": [], "steps": 0, "outcome": "open",
+                "timings": {}, "offsets": []
+            }
+            self._incidents[iid] = summary
+            self._by_host.setdefault(summary["host"].lower(), []).append(iid)
+            self._by_fp.setdefault(summary["fp"], []).append(iid)
+            self._times.append((summary["started"], iid))
+        summary = self._incidents.get(iid)
+        if summary is None:
+            return
+        summary["offsets"].append(offset)
+        if "ms" in rec:
+            summary["timings"][step] = summary["timings"].get(step, 0) + rec["ms"]
+        if step == "diagnose":
+            summary["diagnosis"] = rec.get("d", "")
+        elif step == "execute":
+            summary["actions"].append((rec.get("cmd", ""), not rec.get("err")))
+            summary["steps"] += 1
+        elif step == "close":
+            summary["outcome"] = rec.get("r", "finish")
+
+    def append(self, incident_id: str, step: str, **fields) -> Optional[dict]:
+        if not self.enabled or not incident_id:
+            return None
+        rec = {"i": incident_id, "t": round(time.time(), 3), "s": step}
+        rec.update({k: v for k, v in fields.items() if v is not None})
+        line = (json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode()
+        try:
+            with self._lock:
+                self._load()
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "ab") as f:
+                    offset = f.tell()
+                    f.write(line)
+                self._index(rec, offset)
+        except OSError as e:
+            print(f"Incident log write failed: {e}")
+        return rec
+
+    def open(self, host: str, anomalies: List[str], metrics: dict) -> Optional[str]:
+        """
+        Starts an incident and returns its id (None when the store is disabled).
+        """
+        if not self.enabled:
+            return None
+        incident_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(2)}"
+        compact = {k: v for k, v in (metrics or {}).items() if k not in _DERIVED_METRICS}
+        self.append(incident_id, "open", h=host, fp=fingerprint(anomalies), a=list(anomalies), m=compact)
+        return incident_id
+
+    def query(self, host: str = None, fp: str = None, since: float = None, until: float = None,
+              text: str = None, limit: int = 10) -> List[dict]:
+        """
+        Incident summaries, newest first.
+        """
+        with self._lock:
+            self._load()
+            if host:
+                ids = self._by_host.get(host.lower(), [])
+            elif fp:
+                ids = self._by_fp.get(fp, [])
+            else:
+                lo = bisect.bisect_left(self._times, (since,)) if since else 0
+                ids = [iid for _, iid in self._times[lo:]]
+            results = []
+            for iid in reversed(ids):
+                s = self._incidents[iid]
+                if (fp and s["fp"] != fp) or (since and s["started"] < since) or (until and s["started"] > until):
+                    continue
+                if text and text.lower() not in " ".join(s["anomalies"] + [s["diagnosis"]]).lower():
+                    continue
+                results.append({k: v for k, v in s.items() if k != "offsets"})
+                if len(results) >= limit:
+                    break
+            return results
+
+    def summary(self, incident_id: str) -> Optional[dict]:
+        with self._lock:
+            self._load()
+            s = self._incidents.get(incident_id)
+            return {k: v for k, v in s.items() if k != "offsets"} if s else None
+
+    def get(self, incident_id: str) -> List[dict]:
+        """
+        All records of one incident, in order.
+        """
+        with self._lock:
+            self._load()
+            summary = self._incidents.get(incident_id)
+            if not summary:
+                return []
+            records = []
+            with open(self.path, "rb") as f:
+                for offset in summary["offsets"]:
+                    f.seek(offset)
+                    records.append(json.loads(f.readline()))
+        for rec in records:
+            if rec["s"] == "open":
+                # Rebuild net_stats in its original place so the diagnosis prompt is identical
+                rec["m"] = {
+                    k2: v2 for k, v in rec.get("m", {}).items()
+                    for k2, v2 in ([(k, v), ("net_stats", format_net(v))] if k == "net" else [(k, v)])
+                }
+        return records
+
+def format_incidents(summaries: List[dict]) -> str:
+    if not summaries:
+        return "No incidents recorded."
+    lines = []
+    for s in summaries:
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(s["started"]))
+        total = sum(s["timings"].values())
+        lines.append(f"{s['id']} [{s['host']}] {started} ({s['outcome']}, {s['steps']} steps, {total / 1000:.1f}s) fp={s['fp']}")
+        lines.append(f"  Anomalies: {'; '.join(s['anomalies'])[:200]}")
+        if s["diagnosis"]:
+            lines.append(f"  Diagnosis: {s['diagnosis'][:200]}")
+        for cmd, ok in s["actions"][-3:]:
+            lines.append(f"  {'✓' if ok else '✗'} {cmd[:100]}")
+    return "\n".join(lines)
+
+store = IncidentStore()
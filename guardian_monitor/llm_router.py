@@ -0,0 +1,158 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, List
+
+DEFAULT_OLLAMA_URL = "http://10.29.93.56:11434"
+# Seconds an endpoint is skipped after failing
+ENDPOINT_COOLDOWN = float(os.getenv("OLLAMA_ENDPOINT_COOLDOWN", "60"))
+
+
+# Turns longer than this always go to the large model
+FAST_ROUTE_MAX_CHARS = int(os.getenv("FAST_ROUTE_MAX_CHARS", "120"))
+
+# Words that signal root-cause analysis or a multi-step plan (large model)
+_DEEP_KEYWORDS = re.compile(
+    r"\b(por\s*qu[eé]|why|causa|cause|error|fall[aoó]|fail|crash|ca[ií]d[oa]|lent[oa]|slow|"
+    r"problema|problem|arregl|repar|fix|solucion|limpi|clean|plan|logs?|investig|explica|explain)",
+    re.IGNORECASE
+)
+_GREETING = re.compile(r"^\s*(hola|hello|hi|hey|buen[oa]s|gracias|thanks|ok|vale|adi[oó]s|bye)\b", re.IGNORECASE)
+
+# Phrases of a fast-model answer that should be retried with the large model
+_LOW_CONFIDENCE = re.compile(
+    r"(no estoy segur|no s[eé]\b|no tengo suficiente|i'?m not sure|i don'?t know|not enough information|cannot determine)",
+    re.IGNORECASE
+)
+
+def route_config(route: str) -> dict:
+    """
+    Model, temperature and timeout for a route. Read at call time so .env changes apply.
+      - fast: greetings, status questions and tool routing (OLLAMA_FAST_MODEL)
+      - chat: open-ended chat and planning (OLLAMA_MODEL)
+      - diagnosis: root-cause analysis in diagnose_node (OLLAMA_DIAGNOSIS_MODEL)
+    """
+    large = os.getenv("OLLAMA_MODEL", "llama3")
+    routes = {
+        "fast": {
+            "model": os.getenv("OLLAMA_FAST_MODEL", large),
+            "temperature": 0.3,
+            "timeout": float(os.getenv("FAST_ROUTE_TIMEOUT", "60"))
+        },
+        "chat": {
+            "model": large,
+            "temperature": 0.7,
+            "timeout": float(os.getenv("CHAT_ROUTE_TIMEOUT", "600"))
+        },
+        "diagnosis": {
+            "model": os.getenv("OLLAMA_DIAGNOSIS_MODEL", large),
+            "temperature": 0,
+            "timeout": float(os.getenv("DIAGNOSIS_ROUTE_TIMEOUT", "600"))
+        }
+    }
+    return routes[route]
+
+def fast_route_enabled() -> bool:
+    """
+    Without a distinct small model there is nothing to gain from routing.
+    """
+    return route_config("fast")["model"] != route_config("chat")["model"]
+
+def classify_turn(message: str) -> str:
+    """
+    Picks the route for a chat turn: 'fast' for short routine turns, 'chat' otherwise.
+    """
+    if not fast_route_enabled():
+        return "chat"
+    text = message.strip()
+    if _GREETING.match(text) and len(text) < 40:
+        return "fast"
+    if len(text) > FAST_ROUTE_MAX_CHARS or _DEEP_KEYWORDS.search(text):
+        return "chat"
+    return "fast"
+
+def is_low_confidence(answer: str) -> bool:
+    return not answer.strip() or bool(_LOW_CONFIDENCE.search(answer))
+
+_failover_errors = None
+
+def failover_errors() -> tuple:
+    """
+    Errors that mean "this endpoint is unusable right now" (as opposed to a bad request).
+    Built on first use so the Ollama client isn't imported at startup.
+    """
+    global _failover_errors
+    if _failover_errors is None:
+        import httpx
+        from ollama import ResponseError
+        _failover_errors = (asyncio.TimeoutError, ConnectionError, httpx.TransportError, ResponseError)
+    return _failover_errors
+
+_down_until = {}
+_down_lock = threading.Lock()
+
+def endpoints() -> List[str]:
+    """
+    Ollama endpoints in preference order (OLLAMA_BASE_URLS, comma-separated,
+    falling back to OLLAMA_BASE_URL). Endpoints that failed recently go last.
+    """
+    raw = os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", DEFAULT_OLLAMA_URL)
+    urls = [u.strip() for u in raw.split(",") if u.strip()]
+    now = time.monotonic()
+    with _down_lock:
+        return sorted(urls, key=lambda u: _down_until.get(u, 0) > now)
+
+def mark_failed(base_url: str):
+    with _down_lock:
+        _down_until[base_url] = time.monotonic() + ENDPOINT_COOLDOWN
+    print(f"Ollama endpoint {base_url} marked down for {ENDPOINT_COOLDOWN:.0f}s")
+
+# route -> chat model, used instead of Ollama while set (incident replay)
+_llm_factory = None
+
+@contextmanager
+def override_llm(factory: Callable):
+    """
+    Makes get_llm return `factory(route)` inside the block (e.g. a fake chat model).
+    """
+    global _llm_factory
+    previous, _llm_factory = _llm_factory, factory
+    try:
+        yield
+    finally:
+        _llm_factory = previous
+
+def get_llm(route: str, base_url: str = None, **overrides) -> "ChatOllama":
+    if _llm_factory:
+        return _llm_factory(route)
+    from langchain_ollama import ChatOllama
+    cfg = route_config(route)
+    params = {
+        "model": cfg["model"],
+        "base_url": base_url or endpoints()[0],
+        "temperature": cfg["temperature"],
+        # HTTP timeout so a hung endpoint fails over instead of blocking forever
+        "client_kwargs": {"timeout": cfg["timeout"]}
+    }
+    params.update(overrides)
+    return ChatOllama(**params)
+
+async def ainvoke_with_fallback(route: str, build: Callable, inputs, **llm_overrides):
+    """
+    Builds a runnable with `build(llm)` for each endpoint in turn and invokes it
+    under the route timeout; endpoints that time out or error are marked down.
+    """
+    timeout = route_config(route)["timeout"]
+    last_error = None
+    for base_url in endpoints():
+        runnable = build(get_llm(route, base_url, **llm_overrides))
+        try:
+            return await asyncio.wait_for(runnable.ainvoke(inputs), timeout)
+        except failover_errors() as e:
+            last_error = e if not isinstance(e, asyncio.TimeoutError) else TimeoutError(f"{route} route timed out after {timeout:g}s")
+            print(f"LLM call on {base_url} failed ({route}): {last_error}")
+            mark_failed(base_url)
+    raise last_error
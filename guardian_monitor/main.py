@@ -1,15 +1,19 @@
 import asyncio
 import os
 import sys
+import time
 from dotenv import load_dotenv
-from guardian_monitor.graph import create_graph
-from guardian_monitor import bot
+from guardian_monitor import bot, perf
+from guardian_monitor.agent_hub import hub as agent_hub
+from guardian_monitor.scheduler import scheduler, SCHEDULER_ENABLED
+from guardian_monitor.checks import engine as checks_engine, CHECKS_ENABLED
 
 load_dotenv()
 
 
 
 async def main():
+    start = time.perf_counter()
     print("Initializing Guardian System...")
     local_mode = os.getenv("LOCAL_MODE", "False").lower() == "true"
     print(f"Mode: {'LOCAL' if local_mode else 'SSH'}")
@@ -19,18 +23,37 @@ async def main():
     # We use updater.start_polling() context or similar approach for async integration
     # python-telegram-bot v20+ recommended way:
     application = bot.create_bot_app()
+    warm_up = None
     
     try:
         if application:
             print("Starting Telegram Bot...")
             await application.initialize()
             await application.start()
-            print("Bot is running. Press Ctrl+C to stop.")
             
             # Keep alive
             stop_signal = asyncio.Event()
             # We need polling
+            # Poll first: commands like /status answer before the heavy parts are loaded
             await application.updater.start_polling()
+            perf.record("startup.polling", "local", time.perf_counter() - start)
+            print(f"Bot is running ({time.perf_counter() - start:.2f}s). Press Ctrl+C to stop.")
+            
+            # Prometheus exporter (PERF_METRICS_PORT)
+            perf.start_exporter()
+            # Push agents (hosts with "agent": true, or AGENT_MODE=true)
+            agent_hub.start()
+            # Adaptive per-host sampling (SCHEDULER_ENABLED=true)
+            if SCHEDULER_ENABLED:
+                scheduler.on_change = bot.notify_host_anomalies
+                scheduler.start()
+            # Health checks from config/checks.json, alerting on failure/recovery
+            if CHECKS_ENABLED:
+                checks_engine.on_change = bot.notify_check_change
+                checks_engine.start()
+            # LLM stack and chat graph in the background
+            warm_up = asyncio.create_task(bot.warm_up())
+            
             await stop_signal.wait()
 
         else:
@@ -38,6 +61,12 @@ async def main():
     except KeyboardInterrupt:
         pass
     finally:
+        if warm_up:
+            warm_up.cancel()
+            await asyncio.gather(warm_up, return_exceptions=True)
+        await scheduler.stop()
+        await checks_engine.stop()
+        agent_hub.stop()
         if application:
             await application.updater.stop()
             await application.stop()
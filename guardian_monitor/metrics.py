@@ -0,0 +1,217 @@
+import os
+import time
+import threading
+from typing import Dict, Optional
+from guardian_monitor.ssh_tools import run_command
+
+DISK_THRESHOLD = float(os.getenv("DISK_THRESHOLD", "90.0"))
+INODE_THRESHOLD = float(os.getenv("INODE_THRESHOLD", "90.0"))
+# % of link speed considered saturated
+NET_THRESHOLD = float(os.getenv("NET_THRESHOLD", "80.0"))
+
+SECTION_SEP = "@@GUARDIAN@@"
+
+# Both df views in a single round trip. df exits non-zero if any mount is unreadable,
+# which would make run_command discard stdout, hence the trailing 'true'.
+DF_COMMAND = f"df -PkT 2>/dev/null; echo '{SECTION_SEP}'; df -PiT 2>/dev/null; true"
+
+# Counters plus link speed (Mbps, -1/empty for virtual interfaces)
+NET_COMMAND = (
+    f"cat /proc/net/dev; echo '{SECTION_SEP}'; "
+    "for i in /sys/class/net/*; do echo \"${i##*/} $(cat $i/speed 2>/dev/null)\"; done; true"
+)
+
+# Pseudo / in-memory filesystems that are never worth alerting on
+IGNORED_FS_TYPES = {
+    "tmpfs", "devtmpfs", "squashfs", "overlay", "proc", "sysfs", "cgroup", "cgroup2",
+    "devpts", "mqueue", "efivarfs", "autofs", "tracefs", "debugfs", "securityfs",
+    "pstore", "bpf", "configfs", "fusectl", "hugetlbfs", "ramfs", "nsfs", "fuse.lxcfs"
+}
+
+NET_FIELDS = ("rx_bytes", "rx_packets", "rx_errs", "rx_drop", "tx_bytes", "tx_packets", "tx_errs", "tx_drop")
+
+def _split_sections(output: str):
+    parts = output.split(SECTION_SEP)
+    return [p.strip("\n") for p in parts] + [""] * (2 - len(parts))
+
+def parse_df(output: str) -> Dict[str, Dict[str, float]]:
+    """
+    Parses DF_COMMAND output into {mount: {size_gb, used_pct, inode_pct}}.
+    """
+    blocks_out, inodes_out = _split_sections(output)[:2]
+    disks = {}
+
+    for line in blocks_out.splitlines()[1:]:
+        # Filesystem Type 1024-blocks Used Available Capacity Mounted-on (mount may contain spaces)
+        parts = line.split(None, 6)
+        if len(parts) < 7 or parts[1] in IGNORED_FS_TYPES:
+            continue
+        try:
+            size_kb = int(parts[2])
+            if size_kb == 0:
+                continue
+            disks[parts[6]] = {
+                "size_gb": round(size_kb / 1024 / 1024, 1),
+                "used_pct": float(parts[5].rstrip("%")),
+                "inode_pct": 0.0
+            }
+        except ValueError:
+            continue
+
+    for line in inodes_out.splitlines()[1:]:
+        parts = line.split(None, 6)
+        if len(parts) < 7 or parts[6] not in disks:
+            continue
+        # Some filesystems (btrfs, vfat) report "-" for inodes
+        if parts[5].rstrip("%").replace(".", "", 1).isdigit():
+            disks[parts[6]]["inode_pct"] = float(parts[5].rstrip("%"))
+
+    return disks
+
+def parse_net_dev(output: str):
+    """
+    Parses NET_COMMAND output into ({iface: {counter: value}}, {iface: speed_mbps}).
+    """
+    dev_out, speed_out = _split_sections(output)[:2]
+    counters = {}
+    for line in dev_out.splitlines():
+        if ":" not in line:
+            continue
+        iface, data = line.split(":", 1)
+        values = data.split()
+        if len(values) < 16:
+            continue
+        try:
+            rx = [int(v) for v in values[0:4]]
+            tx = [int(v) for v in values[8:12]]
+        except ValueError:
+            continue
+        counters[iface.strip()] = dict(zip(NET_FIELDS, rx + tx))
+
+    speeds = {}
+    for line in speed_out.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("-").isdigit() and int(parts[1]) > 0:
+            speeds[parts[0]] = int(parts[1])
+
+    return counters, speeds
+
+def counter_delta(old: int, new: int) -> int:
+    """
+    Difference between two samples of a monotonic counter.
+    A 32-bit counter that wrapped is corrected; any other decrease is treated as a
+    reset (interface recreated, host rebooted) and the new value is used as-is.
+    """
+    if new >= old:
+        return new - old
+    if old < 2 ** 32:
+        wrapped = new + 2 ** 32 - old
+        if wrapped < 2 ** 31:
+            return wrapped
+    return new
+
+class CounterRates:
+    """
+    Turns successive counter samples into per-second rates.
+    """
+    def __init__(self):
+        self._last: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def update(self, key: str, counters: Dict[str, int], ts: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """
+        Returns {counter: rate_per_second}, or None on the first sample for this key.
+        """
+        ts = time.monotonic() if ts is None else ts
+        with self._lock:
+            prev = self._last.get(key)
+            self._last[key] = (ts, counters)
+        if prev is None or ts <= prev[0]:
+            return None
+        dt = ts - prev[0]
+        return {
+            name: round(counter_delta(prev[1].get(name, value), value) / dt, 2)
+            for name, value in counters.items()
+        }
+
+_net_rates = CounterRates()
+
+def collect_disk_metrics(host: str = "local") -> Dict[str, Dict[str, float]]:
+    return parse_df(run_command(DF_COMMAND, host))
+
+def collect_net_metrics(host: str = "local", min_interval: float = 0.0) -> Dict[str, Dict[str, float]]:
+    """
+    Returns per-interface rates: rx/tx bytes, packets, errors and drops per second,
+    plus link utilization % when the speed is known. Empty until the second sample,
+    unless min_interval > 0, in which case a second sample is taken after that delay.
+    """
+    def sample():
+        counters, speeds = parse_net_dev(run_command(NET_COMMAND, host))
+        return {i: _net_rates.update(f"{host}:{i}", v) for i, v in counters.items()}, speeds
+
+    all_rates, speeds = sample()
+    if min_interval > 0 and all_rates and all(r is None for r in all_rates.values()):
+        time.sleep(min_interval)
+        all_rates, speeds = sample()
+
+    net = {}
+    for iface, rates in all_rates.items():
+        if rates is None:
+            continue
+        entry = {
+            "rx_Bps": rates["rx_bytes"],
+            "tx_Bps": rates["tx_bytes"],
+            "rx_pps": rates["rx_packets"],
+            "tx_pps": rates["tx_packets"],
+            "errs_ps": round(rates["rx_errs"] + rates["tx_errs"], 2),
+            "drop_ps": round(rates["rx_drop"] + rates["tx_drop"], 2)
+        }
+        if iface in speeds:
+            bits = max(rates["rx_bytes"], rates["tx_bytes"]) * 8
+            entry["util_pct"] = round(bits / (speeds[iface] * 1_000_000) * 100, 1)
+        net[iface] = entry
+    return net
+
+def detect_disk_anomalies(disks: Dict[str, Dict[str, float]]) -> list:
+    anomalies = []
+    for mount, d in disks.items():
+        if d["used_pct"] > DISK_THRESHOLD:
+            anomalies.append(f"High Disk Usage on {mount}: {d['used_pct']}%")
+        if d["inode_pct"] > INODE_THRESHOLD:
+            anomalies.append(f"High Inode Usage on {mount}: {d['inode_pct']}%")
+    return anomalies
+
+def detect_net_anomalies(net: Dict[str, Dict[str, float]]) -> list:
+    anomalies = []
+    for iface, n in net.items():
+        if n.get("util_pct", 0) > NET_THRESHOLD:
+            anomalies.append(f"Saturated NIC {iface}: {n['util_pct']}% of link speed")
+        if n["errs_ps"] > 0:
+            anomalies.append(f"Network errors on {iface}: {n['errs_ps']}/s")
+    return anomalies
+
+def _human_rate(bps: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if bps < 1024:
+            return f"{bps:.0f}{unit}"
+        bps /= 1024
+    return f"{bps:.1f}GB/s"
+
+def format_disks(disks: Dict[str, Dict[str, float]]) -> str:
+    if not disks:
+        return "No data"
+    return "\n".join(
+        f"{mount}: {d['used_pct']}% usado, inodos {d['inode_pct']}% ({d['size_gb']}GB)"
+        for mount, d in sorted(disks.items())
+    )
+
+def format_net(net: Dict[str, Dict[str, float]]) -> str:
+    if not net:
+        return "No data (first sample)"
+    lines = []
+    for iface, n in sorted(net.items()):
+        line = f"{iface}: rx {_human_rate(n['rx_Bps'])} tx {_human_rate(n['tx_Bps'])}, errs {n['errs_ps']}/s, drop {n['drop_ps']}/s"
+        if "util_pct" in n:
+            line += f", uso {n['util_pct']}%"
+        lines.append(line)
+    return "\n".join(lines)
@@ -1,10 +1,21 @@
+import ast
 import json
-from guardian_monitor.state import GuardianState
+import re
+import time
+from pydantic import ValidationError
+from guardian_monitor.state import GuardianState, Diagnosis
 from guardian_monitor.ssh_tools import run_command
-from langchain_ollama import ChatOllama
+from guardian_monitor import llm_router
 from langchain_core.prompts import ChatPromptTemplate
-from guardian_monitor import bot
-from guardian_monitor.search_tools import search_duckduckgo
+from guardian_monitor import bot, perf, incidents, checks
+from guardian_monitor.scheduler import scheduler
+from guardian_monitor.compact import compact_output
+from guardian_monitor.search_tools import asearch_duckduckgo
+from guardian_monitor.proc_snapshot import sample_processes, format_deltas
+from guardian_monitor.agent_hub import hub as agent_hub
+from guardian_monitor.metrics import (
+    collect_disk_metrics, collect_net_metrics, detect_disk_anomalies, detect_net_anomalies, format_net
+)
 import os
 import asyncio
 
@@ -14,6 +25,9 @@ CPU_THRESHOLD = float(os.getenv("CPU_THRESHOLD", "80.0"))
 DISK_THRESHOLD = float(os.getenv("DISK_THRESHOLD", "90.0"))
 RAM_THRESHOLD = float(os.getenv("RAM_THRESHOLD", "90.0"))
 
+# How many times diagnose_node re-asks the LLM when the output can't be parsed or repaired
+DIAGNOSIS_MAX_RETRIES = int(os.getenv("DIAGNOSIS_MAX_RETRIES", "1"))
+
 SAFE_COMMANDS = ["ls", "cat", "grep", "head", "tail", "who", "ps", "top", "df", "free", "ip", "uptime", "journalctl", "netstat", "ss", "search"]
 
 def sanitize_command(cmd: str) -> str:
@@ -57,86 +71,91 @@ async def monitor_node(state: GuardianState) -> GuardianState:
         bot.BotGlobals.manual_trigger.clear()
         print("--- MANUAL MONITORING TRIGGERED ---")
     
-    # Check CPU Percentage (real usage 0-100%)
     loop = asyncio.get_event_loop()
-    try:
-        # Run top twice in batch mode to get accurate reading (first is often average since boot)
-        # Actually top -bn2 -d 0.5 | grep "Cpu(s)" | tail -n 1
-        top_cpu = await loop.run_in_executor(None, run_command, "top -bn2 -d 0.5 | grep 'Cpu(s)' | tail -n 1")
-        # Example: "%Cpu(s):  5.9 us,  2.0 sy,  0.0 ni, 92.1 id,  0.0 wa,  0.0 hi,  0.0 si,  0.0 st"
-        # Extract idle value (id)
-        parts = top_cpu.split(",")
-        idle_str = [x for x in parts if "id" in x][0]
-        # " 92.1 id"
-        idle_val = float(idle_str.split("id")[0].strip())
-        cpu_usage = 100.0 - idle_val
-        cpu_usage = round(cpu_usage, 2)
-    except:
-        cpu_usage = 0.0
-        
+    
     # Still get uptime for display
     uptime_output = await loop.run_in_executor(None, run_command, "uptime")
         
-    # Check Disk
-    df_output = await loop.run_in_executor(None, run_command, "df -h /")
-    # Example: "/dev/sda1        20G   15G  4.0G  79% /"
-    try:
-        lines = df_output.splitlines()
-        # Find the line with "/" mounted
-        disk_line = [l for l in lines if l.endswith("/")][0]
-        # Parse percentage (remove %)
-        disk_usage_str = [x for x in disk_line.split() if x.endswith("%")][0]
-        disk_usage = float(disk_usage_str.strip("%"))
-    except:
-        disk_usage = 0.0
+    pushed = agent_hub.get_metrics("local")
+    if pushed:
+        # Agent mode: CPU/RAM/disk/net come from the pushed stream
+        cpu_usage, ram_usage = pushed["cpu_usage"], pushed["ram_usage"]
+        disks, net = pushed["disks"], pushed["net"]
+        disk_usage = disks.get("/", {}).get("used_pct", 0.0)
+    else:
+        # Check CPU Percentage (real usage 0-100%)
+        try:
+            # Run top twice in batch mode to get accurate reading (first is often average since boot)
+            # Actually top -bn2 -d 0.5 | grep "Cpu(s)" | tail -n 1
+            top_cpu = await loop.run_in_executor(None, run_command, "top -bn2 -d 0.5 | grep 'Cpu(s)' | tail -n 1")
+            # Example: "%Cpu(s):  5.9 us,  2.0 sy,  0.0 ni, 92.1 id,  0.0 wa,  0.0 hi,  0.0 si,  0.0 st"
+            # Extract idle value (id)
+            parts = top_cpu.split(",")
+            idle_str = [x for x in parts if "id" in x][0]
+            # " 92.1 id"
+            idle_val = float(idle_str.split("id")[0].strip())
+            cpu_usage = 100.0 - idle_val
+            cpu_usage = round(cpu_usage, 2)
+        except:
+            cpu_usage = 0.0
+        
+        # Check Disk (every real mount, including inode usage)
+        disks = await loop.run_in_executor(None, collect_disk_metrics, "local")
+        disk_usage = disks.get("/", {}).get("used_pct", 0.0)
 
-    # Check RAM
-    free_output = await loop.run_in_executor(None, run_command, "free -m")
-    try:
-        # Mem:           7954        3934        1567
-        # We want used / total
-        lines = free_output.splitlines()
-        mem_line = [l for l in lines if l.startswith("Mem:")][0]
-        parts = mem_line.split()
-        total_ram = int(parts[1])
-        used_ram = int(parts[2])
-        ram_usage = (used_ram / total_ram) * 100
-    except:
-        ram_usage = 0.0
+        # Check RAM
+        free_output = await loop.run_in_executor(None, run_command, "free -m")
+        try:
+            # Mem:           7954        3934        1567
+            # We want used / total
+            lines = free_output.splitlines()
+            mem_line = [l for l in lines if l.startswith("Mem:")][0]
+            parts = mem_line.split()
+            total_ram = int(parts[1])
+            used_ram = int(parts[2])
+            ram_usage = (used_ram / total_ram) * 100
+        except:
+            ram_usage = 0.0
 
-    # Check Network
-    net_output = await loop.run_in_executor(None, run_command, "cat /proc/net/dev")
-    
-    # Check Top Processes (CPU)
-    # ps -eo pid,cmd,%mem,%cpu --sort=-%cpu | head -n 6
-    top_procs_output = await loop.run_in_executor(None, run_command, "ps -eo pid,cmd,%mem,%cpu --sort=-%cpu | head -n 10")
-    
-    # Filter out our own PID to avoid self-diagnosis
-    my_pid = str(os.getpid())
-    filtered_procs = []
-    for line in top_procs_output.splitlines():
-        if my_pid in line and "python" in line:
-            continue
-        filtered_procs.append(line)
-    
-    top_procs = "\n".join(filtered_procs[:6]) # Keep header + top 5
+        # Check Network (per-interface rates from consecutive counter samples)
+        net = await loop.run_in_executor(None, collect_net_metrics, "local")
+
+    # Check Top Processes (full snapshot diffed against the previous cycle; own PID excluded)
+    tracker = await loop.run_in_executor(None, sample_processes, "local")
+    if tracker:
+        top_procs = format_deltas(tracker.top_consumers(5))
+        growers = tracker.top_growers(3)
+        top_growers = format_deltas(growers) if growers else "None"
+    else:
+        top_procs = top_growers = "No data"
         
     metrics = {
         "cpu_usage": cpu_usage,
         "disk_usage": disk_usage,
+        "disks": disks,
         "ram_usage": ram_usage,
-        "net_stats": net_output[:200] + "...", # Truncate for prompt size
+        "net": net,
+        "net_stats": format_net(net),
         "top_processes": top_procs,
+        "top_growers": top_growers,
         "raw_uptime": uptime_output
     }
     
     anomalies = []
     if cpu_usage > CPU_THRESHOLD:
         anomalies.append(f"High CPU Usage: {cpu_usage}% (Threshold: {CPU_THRESHOLD}%)")
-    if disk_usage > DISK_THRESHOLD:
-        anomalies.append(f"High Disk Usage: {disk_usage}%")
+    anomalies.extend(detect_disk_anomalies(disks))
+    anomalies.extend(detect_net_anomalies(net))
     if ram_usage > RAM_THRESHOLD:
         anomalies.append(f"High RAM Usage: {ram_usage:.1f}%")
+
+    # Other hosts, from the adaptive scheduler's latest samples (local is measured above)
+    for host, host_anomalies in scheduler.anomalies().items():
+        if host.lower() != "local":
+            anomalies.extend(f"[{host}] {a}" for a in host_anomalies)
+
+    # Configured checks (config/checks.json): latest results of the background probes
+    check_failures = checks.engine.anomalies()
         
     # Check for Manual Trigger from Telegram
     is_manual = False
@@ -155,6 +174,8 @@ async def monitor_node(state: GuardianState) -> GuardianState:
     # OK, STRICT passive mode.
     if not is_manual:
         anomalies = []
+    # ...except failed checks: those are deterministic outages, not noisy thresholds
+    anomalies.extend(a for a in check_failures if a not in anomalies)
 
     # Inject fake anomaly for testing if needed
     if os.getenv("TEST_ANOMALY", "False").lower() == "true":
@@ -168,10 +189,85 @@ async def monitor_node(state: GuardianState) -> GuardianState:
         "metrics": metrics,
         "anomalies": anomalies,
         "investigation_history": [], # Reset history
-        "steps_count": 0
+        "steps_count": 0,
+        "host": "local",
+        "incident_id": None
     }
 
+def _repair_diagnosis_json(content: str) -> Diagnosis:
+    """
+    Best-effort recovery of a Diagnosis from malformed LLM output.
+    Handles markdown fences, surrounding chatter, single-quoted pseudo-JSON
+    and loosely spelled action types. Raises ValueError if nothing usable is found.
+    """
+    text = content.strip()
+
+    # Strip ```json ... ``` fences
+    text = re.sub(r"^```[a-zA-Z]*\s*", "", text)
+    text = re.sub(r"\s*```$", "", text)
+
+    # Keep only the outermost {...} block
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise ValueError("No JSON object found in LLM output")
+    text = text[start:end + 1]
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # {'diagnosis': '...'} style (the format older prompts showed the model)
+        try:
+            data = ast.literal_eval(text)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"Unparseable LLM output: {e}")
+
+    if not isinstance(data, dict):
+        raise ValueError("LLM output is not a JSON object")
+
+    action_type = str(data.get("action_type", "investigate")).strip().lower()
+    # "investigate|fix|finish" copied verbatim from the prompt, or other noise
+    if action_type not in ("investigate", "fix", "finish"):
+        action_type = next((t for t in ("finish", "fix", "investigate") if t in action_type), "investigate")
+
+    proposed_action = str(data.get("proposed_action") or "FINISH")
+    if proposed_action.strip().upper() == "FINISH":
+        action_type = "finish"
+
+    return Diagnosis(
+        diagnosis=str(data.get("diagnosis") or "Unknown"),
+        proposed_action=proposed_action,
+        action_type=action_type,
+    )
+
+def parse_diagnosis(content: str) -> Diagnosis:
+    """
+    Parses the LLM response into a Diagnosis, falling back to the repair parser.
+    """
+    try:
+        return Diagnosis.model_validate_json(content)
+    except ValidationError:
+        return _repair_diagnosis_json(content)
+
+def _elapsed_ms(start: float) -> int:
+    return int((time.perf_counter() - start) * 1000)
+
 async def diagnose_node(state: GuardianState) -> GuardianState:
+    start = time.perf_counter()
+    incident_id = state.get("incident_id")
+    if not incident_id and state.get("anomalies"):
+        # First diagnosis of a new set of anomalies opens an incident
+        incident_id = incidents.store.open(state.get("host", "local"), state["anomalies"], state.get("metrics", {}))
+    
+    raw_outputs = []
+    result = await _diagnose(state, raw_outputs)
+    if incident_id:
+        incidents.store.append(
+            incident_id, "diagnose", ms=_elapsed_ms(start), d=result["diagnosis"], p=result["proposed_action"],
+            k=result["action_type"], raw=raw_outputs[-1] if raw_outputs else None
+        )
+    return {**result, "incident_id": incident_id}
+
+async def _diagnose(state: GuardianState, raw_outputs: list) -> GuardianState:
     print("--- DIAGNOSING ISSUE ---")
     metrics = state["metrics"]
     anomalies = state["anomalies"]
@@ -181,14 +277,7 @@ async def diagnose_node(state: GuardianState) -> GuardianState:
     if not anomalies and not history:
         return {**state, "diagnosis": "System Healthy", "proposed_action": "", "action_type": "none"}
 
-    # Ollama Configuration
-    ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://10.29.93.56:11434")
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3")
-
     try:
-        print(f"Connecting to Ollama at {ollama_base_url}...")
-        llm = ChatOllama(model=ollama_model, base_url=ollama_base_url, temperature=0)
-        
         prompt = ChatPromptTemplate.from_messages([
             ("system", """You are a Linux SysAdmin. Analyze the system metrics and anomalies. 
             You have permissions to execute standard Linux commands.
@@ -197,9 +286,9 @@ async def diagnose_node(state: GuardianState) -> GuardianState:
             {history}
             
             GOAL:
-            1. If you need more info to identify the root cause, propose a SAFE command (e.g. cat logs, ps aux). Set 'action_type' to 'investigate'.
-            2. If you have identified the root cause and know the fix, propose an ACTION command (e.g. systemctl restart <service>, rm <file>, kill <pid>). Set 'action_type' to 'fix'.
-            3. If the system is healthy or you cannot do anything more, set 'proposed_action' to 'FINISH' and 'action_type' to 'finish'.
+            1. If you need more info to identify the root cause, propose a SAFE command (e.g. cat logs, ps aux). Set "action_type" to "investigate".
+            2. If you have identified the root cause and know the fix, propose an ACTION command (e.g. systemctl restart <service>, rm <file>, kill <pid>). Set "action_type" to "fix".
+            3. If the system is healthy or you cannot do anything more, set "proposed_action" to "FINISH" and "action_type" to "finish".
             
             CRITICAL RULES:
             - **DIAGNOSIS MUST BE SPECIFIC**: Don't say "resource-intensive processes". Say "Process 'rustdesk' (PID 1234) is using 80% CPU".
@@ -220,33 +309,50 @@ async def diagnose_node(state: GuardianState) -> GuardianState:
             - Web Search: search "query" (e.g. search "nginx failed to bind port 80")
             
             Propose a SINGLE command.
-            Return ONLY JSON: {{'diagnosis': '...', 'proposed_action': '...', 'action_type': 'investigate|fix|finish'}}"""),
+            Return ONLY a JSON object with double-quoted keys and strings, e.g.:
+            {{"diagnosis": "...", "proposed_action": "...", "action_type": "investigate"}}"""),
+            ("placeholder", "{repair}"),
             ("user", "Metrics: {metrics}\nAnomalies: {anomalies}\n\nProvide response in JSON format.")
         ])
         
-        
-        chain = prompt | llm
-        
-        # Async invoke if supported, otherwise wrapper
-        response = await chain.ainvoke({
+        inputs = {
             "metrics": str(metrics), 
             "anomalies": str(anomalies),
-            "history": "\n".join(history) if history else "None"
-        })
-        
-        # Simple JSON parsing (robustness would require OutputParser)
-        content = response.content.strip()
-        if content.startswith("```json"):
-            content = content.replace("```json", "").replace("```", "")
+            "history": "\n".join(history) if history else "None",
+            "repair": []
+        }
         
-        data = json.loads(content)
+        # Parse (with repair); on failure re-ask the model with the error instead of giving up
+        last_error = None
+        for attempt in range(DIAGNOSIS_MAX_RETRIES + 1):
+            with perf.timed("llm.diagnose", llm_router.route_config("diagnosis")["model"]):
+                # Large model, constrained to the Diagnosis JSON schema (Ollama structured outputs),
+                # failing over between Ollama endpoints
+                response = await llm_router.ainvoke_with_fallback(
+                    "diagnosis", lambda llm: prompt | llm, inputs,
+                    format=Diagnosis.model_json_schema()
+                )
+            content = response.content.strip()
+            raw_outputs.append(content)
+            try:
+                data = parse_diagnosis(content)
+                break
+            except (ValueError, ValidationError) as e:
+                last_error = e
+                print(f"Diagnosis output malformed (attempt {attempt + 1}): {e}")
+                inputs["repair"] = [
+                    ("ai", content),
+                    ("user", f"Your previous answer was not valid JSON for the required schema ({e}). "
+                             "Reply again with ONLY the JSON object.")
+                ]
+        else:
+            raise ValueError(f"LLM returned malformed diagnosis: {last_error}")
         
         return {
             **state,
-            **state,
-            "diagnosis": data.get("diagnosis", "Unknown"),
-            "proposed_action": sanitize_command(data.get("proposed_action", "echo 'No action'")),
-            "action_type": data.get("action_type", "investigate")
+            "diagnosis": data.diagnosis,
+            "proposed_action": sanitize_command(data.proposed_action),
+            "action_type": data.action_type
         }
     except Exception as e:
         return {
@@ -256,7 +362,29 @@ async def diagnose_node(state: GuardianState) -> GuardianState:
             "action_type": "finish"
         }
 
+def is_auto_approved(action: str, action_type: str) -> bool:
+    """
+    Only "investigate" actions that start with a SAFE_COMMANDS prefix run without asking.
+    """
+    if action_type != "investigate" or not action.split():
+        return False
+    return action.split()[0] in SAFE_COMMANDS
+
 async def review_node(state: GuardianState) -> GuardianState:
+    start = time.perf_counter()
+    result, approved_by = await _review(state)
+    incident_id = state.get("incident_id")
+    if incident_id:
+        incidents.store.append(incident_id, "review", ms=_elapsed_ms(start), ok=result["human_approval"], by=approved_by)
+        if approved_by == "none" or not result["human_approval"]:
+            incidents.store.append(incident_id, "close", r="finish" if approved_by == "none" else "rejected",
+                                   n=state.get("steps_count", 0))
+    return result
+
+async def _review(state: GuardianState):
+    """
+    Returns (new state, who decided: 'none' | 'auto' | 'human' | 'cli').
+    """
     print("\n--- HUMAN REVIEW ---")
     diagnosis = state['diagnosis']
     action = state['proposed_action']
@@ -272,16 +400,11 @@ async def review_node(state: GuardianState) -> GuardianState:
     if action == "FINISH" or action_type == "finish":
         bot.BotGlobals.current_diagnosis = None
         bot.BotGlobals.current_action = None
-        return {**state, "human_approval": False}
+        return {**state, "human_approval": False}, "none"
 
     # CHECK SAFETY FOR AUTO-APPROVAL
     # We only auto-approve "investigate" actions that start with safe prefixes
-    is_safe = False
-    if action_type == "investigate":
-        # Check against SAFE_COMMANDS list
-        cmd_prefix = action.split()[0]
-        if cmd_prefix in SAFE_COMMANDS:
-             is_safe = True
+    is_safe = is_auto_approved(action, action_type)
     
     if is_safe:
         print("✅ AUTO-APPROVED SAFE COMMAND")
@@ -289,44 +412,62 @@ async def review_node(state: GuardianState) -> GuardianState:
         if bot.BotGlobals.app:
             diagnosis_preview = diagnosis[:200] + "..." if len(diagnosis) > 200 else diagnosis
             await bot.send_execution_result(f"(Auto) {action}", f"🧠 Reasoning: {diagnosis_preview}\n\nRunning investigation...")
-        return {**state, "human_approval": True}
+        return {**state, "human_approval": True}, "auto"
     
     # Check if we have a bot
     if bot.BotGlobals.app:
         print("Creating Telegram alert...")
         approved = await bot.send_approval_request(diagnosis, action)
+        approved_by = "human"
     else:
         # Fallback to CLI
         loop = asyncio.get_event_loop()
         print("Response required in CLI (No Telegram Token found)...")
         response = await loop.run_in_executor(None, input, "Do you approve this action? (y/n): ")
         approved = response.lower().startswith('y')
+        approved_by = "cli"
     
-    return {**state, "human_approval": approved}
+    return {**state, "human_approval": approved}, approved_by
+
+def history_entry(action: str, result: str) -> str:
+    """
+    One investigation_history line, as the diagnosis prompt sees it.
+    """
+    status_label = "[FAILURE]" if "Error" in result else "[SUCCESS]"
+    # Compacted with head+tail so the end of the output (usually the error) survives
+    return f"{status_label} Command: {action}\nOutput: {compact_output(result, 'history')}"
 
 async def execute_node(state: GuardianState) -> GuardianState:
     print("--- EXECUTING ACTION ---")
     action = state["proposed_action"]
     
     if state.get("human_approval"):
+        start = time.perf_counter()
         loop = asyncio.get_event_loop()
         
         # Check if it is a search command
         if action.startswith("search "):
             query = action[7:].strip('"').strip("'")
             print(f"Executing Search: {query}")
-            result = await loop.run_in_executor(None, search_duckduckgo, query)
+            result = await asearch_duckduckgo(query)
         else:
-            result = await loop.run_in_executor(None, run_command, action)
+            # On the host the anomalies came from
+            result = await loop.run_in_executor(None, run_command, action, state.get("host", "local"))
             
         print(f"Result: {result}")
+        run_ms = _elapsed_ms(start)
         
         # Send result back to Telegram
+        notify_start = time.perf_counter()
         await bot.send_execution_result(action, result)
         
         # Append to history with Status
-        status_label = "[FAILURE]" if "Error" in result else "[SUCCESS]"
-        new_history = state.get("investigation_history", []) + [f"{status_label} Command: {action}\nOutput: {result[:500]}"]
+        if state.get("incident_id"):
+            incidents.store.append(
+                state["incident_id"], "execute", ms=run_ms, cmd=action,
+                out=result[:incidents.INCIDENT_OUTPUT_MAX], err="Error" in result, nms=_elapsed_ms(notify_start)
+            )
+        new_history = state.get("investigation_history", []) + [history_entry(action, result)]
         
         return {
             **state, 
@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+
+# Recent samples kept per (operation, host) for percentiles
+PERF_WINDOW = int(os.getenv("PERF_WINDOW", "1000"))
+# Prometheus exporter (disabled unless a port is set)
+PERF_METRICS_PORT = int(os.getenv("PERF_METRICS_PORT", "0"))
+PERF_METRICS_ADDR = os.getenv("PERF_METRICS_ADDR", "127.0.0.1")
+
+# Histogram buckets (seconds): from a local command to a slow CPU inference
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=PERF_WINDOW)
+
+    def observe(self, seconds: float, ok: bool = True):
+        self.count += 1
+        self.total += seconds
+        if not ok:
+            self.errors += 1
+        self.samples.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+        return ordered[rank]
+
+_histograms: Dict[Tuple[str, str], Histogram] = {}
+_lock = threading.Lock()
+
+def record(op: str, host: str, seconds: float, ok: bool = True):
+    """
+    Records one timing. `op` is e.g. 'ssh.command', 'llm.diagnose', 'tool.web_search'.
+    """
+    key = (op, str(host or "-"))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(seconds, ok)
+
+@contextmanager
+def timed(op: str, host: str = "local"):
+    """
+    Times the enclosed block (works inside sync and async code).
+    Exceptions are recorded as errors and re-raised.
+    """
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(op, host, time.perf_counter() - start, ok)
+
+def snapshot() -> list:
+    """
+    Returns [{op, host, count, errors, p50, p95, p99, mean}] sorted by op then host.
+    """
+    with _lock:
+        items = list(_histograms.items())
+        rows = [
+            {
+                "op": op,
+                "host": host,
+                "count": h.count,
+                "errors": h.errors,
+                "p50": h.percentile(50),
+                "p95": h.percentile(95),
+                "p99": h.percentile(99),
+                "mean": h.total / h.count if h.count else 0.0
+            }
+            for (op, host), h in items
+        ]
+    return sorted(rows, key=lambda r: (r["op"], r["host"]))
+
+def _fmt(seconds: float) -> str:
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.1f}s"
+
+def format_summary(host: str = None) -> str:
+    """
+    Text table for the /perf command.
+    """
+    rows = [r for r in snapshot() if host is None or r["host"].lower() == host.lower()]
+    if not rows:
+        return "No timings recorded yet."
+    lines = [f"{'op':<22} {'host':<10} {'n':>5} {'p50':>7} {'p95':>7} {'p99':>7}"]
+    for r in rows:
+        lines.append(
+            f"{r['op'][:22]:<22} {r['host'][:10]:<10} {r['count']:>5} "
+            f"{_fmt(r['p50']):>7} {_fmt(r['p95']):>7} {_fmt(r['p99']):>7}"
+            + (f" err={r['errors']}" if r["errors"] else "")
+        )
+    return "\n".join(lines)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus() -> str:
+    """
+    Prometheus text exposition format.
+    """
+    out = [
+        "# HELP guardmon_op_duration_seconds Latency of GuardMonBot operations.",
+        "# TYPE guardmon_op_duration_seconds histogram"
+    ]
+    errors = [
+        "# HELP guardmon_op_errors_total Failed GuardMonBot operations.",
+        "# TYPE guardmon_op_errors_total counter"
+    ]
+    with _lock:
+        for (op, host), h in sorted(_histograms.items()):
+            labels = f'op="{_escape(op)}",host="{_escape(host)}"'
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.bucket_counts):
+                cumulative += count
+                out.append(f'guardmon_op_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            out.append(f'guardmon_op_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            out.append(f"guardmon_op_duration_seconds_sum{{{labels}}} {h.total}")
+            out.append(f"guardmon_op_duration_seconds_count{{{labels}}} {h.count}")
+            errors.append(f"guardmon_op_errors_total{{{labels}}} {h.errors}")
+    return "\n".join(out + errors) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_exporter(port: int = PERF_METRICS_PORT, addr: str = PERF_METRICS_ADDR):
+    """
+    Serves /metrics in a daemon thread. Returns the server, or None if disabled.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    except OSError as e:
+        print(f"Could not start Prometheus exporter on {addr}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="perf-exporter").start()
+    print(f"Prometheus metrics on http://{addr}:{port}/metrics")
+    return server
+
+def _build_callback_handler():
+    # langchain_core is only imported once the agent actually runs
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class PerfCallbackHandler(BaseCallbackHandler):
+        """
+        LangChain callback that times every tool call and LLM call made by the agent graph.
+        """
+        run_inline = True
+
+        def __init__(self):
+            self._starts = {}
+
+        def _finish(self, run_id, ok: bool):
+            started = self._starts.pop(run_id, None)
+            if started:
+                op, host, start = started
+                record(op, host, time.perf_counter() - start, ok)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+            host = inputs.get("target_host", "local") if isinstance(inputs, dict) else "local"
+            name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+            self._starts[run_id] = (f"tool.{name}", host, time.perf_counter())
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            self._finish(run_id, True)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id, False)
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+            model = (metadata or {}).get("ls_model_name") or "llm"
+            self._starts[run_id] = ("llm.chat", model, time.perf_counter())
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            self._finish(run_id, True)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self._finish(run_id, False)
+
+    return PerfCallbackHandler
+
+def __getattr__(name):
+    """
+    perf.PerfCallbackHandler is built on first access so importing perf stays cheap.
+    """
+    if name == "PerfCallbackHandler":
+        cls = globals()["PerfCallbackHandler"] = _build_callback_handler()
+        return cls
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,207 @@
+import os
+import time
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from guardian_monitor.ssh_tools import run_command, _is_error
+
+# Full process table, one compact line per process (no header).
+# cputime is cumulative CPU time ([DD-]HH:MM:SS), which lets us compute real rates between snapshots.
+PS_COMMAND = "ps -eo pid=,ppid=,user=,rss=,cputime=,pcpu=,args="
+
+# Max length kept for the command line of each record
+CMD_MAX_LEN = 80
+
+# Minimum time a process must be tracked before its RSS growth rate is reported
+# (a few KB over half a second would otherwise look like a huge leak)
+GROWTH_MIN_TRACK_S = float(os.getenv("PROC_GROWTH_MIN_TRACK_S", "60"))
+
+@dataclass
+class ProcRecord:
+    pid: int
+    ppid: int
+    user: str
+    rss_kb: int
+    cpu_s: float    # Cumulative CPU seconds
+    pcpu: float     # Lifetime average %CPU as reported by ps
+    name: str
+    cmd: str
+
+@dataclass
+class ProcessSnapshot:
+    host: str
+    ts: float       # time.monotonic() when taken
+    procs: Dict[int, ProcRecord]
+
+@dataclass
+class ProcDelta:
+    pid: int
+    name: str
+    cmd: str
+    rss_kb: int
+    cpu_rate: float     # %CPU over the last interval (100 = one full core)
+    rss_delta_kb: int   # RSS change over the last interval
+    growth_kb_min: float  # RSS growth rate since the process was first seen (KiB/min)
+    tracked_s: float    # Seconds since the process was first seen
+
+def _parse_cputime(value: str) -> float:
+    """
+    "1-02:03:04" / "02:03:04" / "03:04" -> seconds
+    """
+    days = 0
+    if "-" in value:
+        d, value = value.split("-", 1)
+        days = int(d)
+    seconds = 0
+    for part in value.split(":"):
+        seconds = seconds * 60 + float(part)
+    return days * 86400 + seconds
+
+def parse_ps_output(output: str, exclude_pids=()) -> Dict[int, ProcRecord]:
+    """
+    Parses PS_COMMAND output into records keyed by PID.
+    """
+    procs = {}
+    for line in output.splitlines():
+        parts = line.split(None, 6)
+        if len(parts) < 7:
+            continue
+        try:
+            pid = int(parts[0])
+            record = ProcRecord(
+                pid=pid,
+                ppid=int(parts[1]),
+                user=parts[2],
+                rss_kb=int(parts[3]),
+                cpu_s=_parse_cputime(parts[4]),
+                pcpu=float(parts[5]),
+                name=os.path.basename(parts[6].split()[0]),
+                cmd=parts[6][:CMD_MAX_LEN]
+            )
+        except (ValueError, IndexError):
+            continue
+        if pid in exclude_pids or record.cmd.startswith(PS_COMMAND[:6]):
+            # Skip ourselves and the ps probe itself
+            continue
+        procs[pid] = record
+    return procs
+
+def take_snapshot(host: str = "local") -> Optional[ProcessSnapshot]:
+    """
+    Collects the full process table of a host. Returns None if the command failed.
+    """
+    output = run_command(PS_COMMAND, host)
+    if _is_error(output):
+        print(f"Process snapshot failed on {host}: {output[:200]}")
+        return None
+
+    # Only filter our own PID on the local host (PIDs on remote hosts are unrelated)
+    exclude = (os.getpid(),) if host == "local" else ()
+    return ProcessSnapshot(host=host, ts=time.monotonic(), procs=parse_ps_output(output, exclude))
+
+class ProcessTracker:
+    """
+    Keeps the previous snapshot and a per-process baseline for one host
+    and diffs each new snapshot against them.
+    """
+    def __init__(self, host: str):
+        self.host = host
+        self.last: Optional[ProcessSnapshot] = None
+        self.deltas: List[ProcDelta] = []
+        # pid -> (first_seen_ts, first_rss_kb, name) to detect slow leaks across many samples
+        self._baseline: Dict[int, tuple] = {}
+
+    def update(self, snap: ProcessSnapshot) -> List[ProcDelta]:
+        prev = self.last
+        dt = (snap.ts - prev.ts) if prev else 0.0
+        deltas = []
+
+        for pid, rec in snap.procs.items():
+            base = self._baseline.get(pid)
+            if base is None or base[2] != rec.name:
+                # New process (or PID reused by another program)
+                base = (snap.ts, rec.rss_kb, rec.name)
+                self._baseline[pid] = base
+
+            old = prev.procs.get(pid) if prev else None
+            if old is not None and old.name == rec.name and dt > 0:
+                cpu_rate = max(0.0, (rec.cpu_s - old.cpu_s) / dt * 100)
+                rss_delta = rec.rss_kb - old.rss_kb
+            else:
+                # No previous sample: best we have is the lifetime average
+                cpu_rate = rec.pcpu
+                rss_delta = 0
+
+            tracked = snap.ts - base[0]
+            growth = (rec.rss_kb - base[1]) / (tracked / 60) if tracked >= GROWTH_MIN_TRACK_S else 0.0
+
+            deltas.append(ProcDelta(
+                pid=pid,
+                name=rec.name,
+                cmd=rec.cmd,
+                rss_kb=rec.rss_kb,
+                cpu_rate=round(cpu_rate, 1),
+                rss_delta_kb=rss_delta,
+                growth_kb_min=round(growth, 1),
+                tracked_s=round(tracked, 1)
+            ))
+
+        # Forget processes that exited
+        for pid in list(self._baseline):
+            if pid not in snap.procs:
+                del self._baseline[pid]
+
+        self.last = snap
+        self.deltas = deltas
+        return deltas
+
+    def top_consumers(self, limit: int = 5, by: str = "cpu") -> List[ProcDelta]:
+        key = (lambda d: d.rss_kb) if by == "mem" else (lambda d: d.cpu_rate)
+        return sorted(self.deltas, key=key, reverse=True)[:limit]
+
+    def top_growers(self, limit: int = 5) -> List[ProcDelta]:
+        growing = [d for d in self.deltas if d.growth_kb_min > 0]
+        return sorted(growing, key=lambda d: d.growth_kb_min, reverse=True)[:limit]
+
+_trackers: Dict[str, ProcessTracker] = {}
+_trackers_lock = threading.Lock()
+
+def get_tracker(host: str = "local") -> ProcessTracker:
+    with _trackers_lock:
+        if host not in _trackers:
+            _trackers[host] = ProcessTracker(host)
+        return _trackers[host]
+
+def sample_processes(host: str = "local", min_interval: float = 0.0) -> Optional[ProcessTracker]:
+    """
+    Takes a snapshot and feeds it to the host tracker.
+    If this is the first snapshot and min_interval > 0, takes a second one
+    after min_interval seconds so CPU rates are real instead of lifetime averages.
+    """
+    tracker = get_tracker(host)
+    first = tracker.last is None
+
+    snap = take_snapshot(host)
+    if snap is None:
+        return None
+    tracker.update(snap)
+
+    if first and min_interval > 0:
+        time.sleep(min_interval)
+        snap = take_snapshot(host)
+        if snap is not None:
+            tracker.update(snap)
+    return tracker
+
+def format_deltas(deltas: List[ProcDelta]) -> str:
+    """
+    Compact table for prompts / Telegram.
+    """
+    if not deltas:
+        return "No data"
+    lines = ["PID     CPU%   RSS(MB)  dRSS(KB)  GROW(KB/min)  CMD"]
+    for d in deltas:
+        lines.append(
+            f"{d.pid:<7} {d.cpu_rate:<6} {d.rss_kb / 1024:<8.1f} {d.rss_delta_kb:<+9} {d.growth_kb_min:<+13} {d.cmd[:50]}"
+        )
+    return "\n".join(lines)
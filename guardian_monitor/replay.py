@@ -0,0 +1,130 @@
+import sys
+import json
+import asyncio
+import argparse
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from guardian_monitor import nodes, incidents, llm_router
+from guardian_monitor.incidents import IncidentStore
+
+# Replays recorded incidents through diagnose -> review -> execute without
+# touching any host: metrics come from the incident log, commands return their
+# recorded output and the LLM is a mock (or the real one with --llm ollama).
+#
+#   python -m guardian_monitor.replay --host local --limit 20
+#   python -m guardian_monitor.replay 20261018-101500-ab12 --llm ollama
+#
+# Exit status is 1 if any replayed step differs from the recording.
+
+NOT_RECORDED = "Error: [replay] output of this command was not recorded"
+
+def _recorded_reply(rec: dict) -> str:
+    return rec.get("raw") or json.dumps({"diagnosis": rec.get("d", ""), "proposed_action": rec.get("p", ""), "action_type": rec.get("k", "")})
+
+async def replay_incident(records: list, llm: str = "recorded", reply: str = None, max_steps: int = None) -> list:
+    """
+    Re-runs one incident from its records. Returns one dict per step with the
+    replayed and recorded diagnosis/action.
+    """
+    opened = next(r for r in records if r["s"] == "open")
+    diagnoses = [r for r in records if r["s"] == "diagnose"]
+    reviews = [r for r in records if r["s"] == "review"]
+    outputs = {r["cmd"]: r.get("out", "") for r in records if r["s"] == "execute"}
+
+    state = {
+        "metrics": opened.get("m", {}),
+        "anomalies": opened.get("a", []),
+        "investigation_history": [],
+        "steps_count": 0,
+        "host": opened.get("h", "local"),
+        "incident_id": None
+    }
+
+    if llm == "ollama":
+        factory = None
+    else:
+        replies = [reply] * max(len(diagnoses), 1) if reply else [_recorded_reply(d) for d in diagnoses]
+        fake = FakeListChatModel(responses=replies or ["{}"])
+        factory = lambda route: fake
+
+    steps = []
+    limit = max_steps or max(len(diagnoses), 1)
+    for i in range(limit):
+        if factory:
+            with llm_router.override_llm(factory):
+                state = await nodes.diagnose_node(state)
+        else:
+            state = await nodes.diagnose_node(state)
+        action, action_type = state["proposed_action"], state["action_type"]
+        recorded = diagnoses[i] if i < len(diagnoses) else None
+        steps.append({
+            "step": i + 1,
+            "diagnosis": state["diagnosis"],
+            "action": action,
+            "action_type": action_type,
+            "recorded": recorded,
+            "match": bool(recorded) and recorded.get("p") == action and recorded.get("k") == action_type
+        })
+        if action == "FINISH" or action_type == "finish":
+            break
+        # Same decision as back then: auto-approval rules, else the recorded human answer
+        approved = nodes.is_auto_approved(action, action_type) or (i < len(reviews) and reviews[i].get("ok", False))
+        if not approved:
+            break
+        result = outputs.get(action, NOT_RECORDED)
+        state = {
+            **state,
+            "investigation_history": state["investigation_history"] + [nodes.history_entry(action, result)],
+            "steps_count": state["steps_count"] + 1
+        }
+    return steps
+
+def format_replay(summary: dict, steps: list) -> str:
+    lines = [f"{summary['id']} [{summary['host']}] {'; '.join(summary['anomalies'])[:120]}"]
+    for s in steps:
+        label = "MATCH" if s["match"] else "DIFF "
+        line = f"  step {s['step']}: {label} {s['action_type']} `{s['action']}`"
+        if not s["match"]:
+            rec = s["recorded"]
+            line += f" (recorded: {rec['k']} `{rec['p']}`)" if rec else " (not recorded)"
+        lines.append(line)
+    return "\n".join(lines)
+
+async def main_async(args) -> int:
+    store = IncidentStore(args.path) if args.path else incidents.store
+    if args.ids:
+        summaries = [s for s in map(store.summary, args.ids) if s]
+    else:
+        summaries = store.query(host=args.host, fp=args.fingerprint, limit=args.limit)
+    if not summaries:
+        print("No incidents to replay.")
+        return 0
+
+    # Replays must not add incidents to the log
+    incidents.store.enabled = False
+    diffs = 0
+    try:
+        for summary in reversed(summaries):
+            steps = await replay_incident(store.get(summary["id"]), args.llm, args.reply, args.max_steps)
+            diffs += sum(not s["match"] for s in steps)
+            print(format_replay(summary, steps))
+    finally:
+        incidents.store.enabled = True
+
+    print(f"\n{len(summaries)} incident(s) replayed, {diffs} differing step(s).")
+    return 1 if diffs else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded incidents against the current pipeline")
+    parser.add_argument("ids", nargs="*", help="Incident ids (default: latest incidents)")
+    parser.add_argument("--host", help="Only incidents of this host")
+    parser.add_argument("--fingerprint", help="Only incidents with this fingerprint")
+    parser.add_argument("--limit", type=int, default=10, help="Number of latest incidents to replay")
+    parser.add_argument("--llm", choices=("recorded", "ollama"), default="recorded",
+                        help="'recorded' replays the logged LLM answers, 'ollama' asks the configured model")
+    parser.add_argument("--reply", help="Fixed mock LLM answer (JSON) for every step")
+    parser.add_argument("--max-steps", type=int, help="Stop after this many diagnosis steps")
+    parser.add_argument("--path", help="Incident log to read (default INCIDENTS_PATH)")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import os
+import time
+import random
+import asyncio
+import contextvars
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+from guardian_monitor import incidents, perf
+from guardian_monitor.incidents import fingerprint
+from guardian_monitor.ssh_tools import run_command, load_hosts, breaker, _is_error
+from guardian_monitor.agent_hub import hub as agent_hub
+from guardian_monitor.metrics import (
+    DISK_THRESHOLD, collect_disk_metrics, collect_net_metrics, detect_disk_anomalies, detect_net_anomalies
+)
+
+# Periodic sampling of every host in hosts.json (off unless enabled)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "False").lower() == "true"
+SCHED_BASE_INTERVAL = float(os.getenv("SCHED_BASE_INTERVAL", "60"))
+# Hosts with anomalies or an active incident
+SCHED_MIN_INTERVAL = float(os.getenv("SCHED_MIN_INTERVAL", "15"))
+# Stable hosts slow down up to this
+SCHED_MAX_INTERVAL = float(os.getenv("SCHED_MAX_INTERVAL", "600"))
+# +/- fraction of the interval, so probes of the fleet don't line up
+SCHED_JITTER = float(os.getenv("SCHED_JITTER", "0.1"))
+# A metric above this fraction of its threshold makes the host 'warm'
+SCHED_NEAR_RATIO = float(os.getenv("SCHED_NEAR_RATIO", "0.85"))
+# Hosts sampled at the same time
+SCHED_CONCURRENCY = int(os.getenv("SCHED_CONCURRENCY", "4"))
+# An incident opened this recently (and not closed) keeps the host 'hot'
+SCHED_INCIDENT_WINDOW = float(os.getenv("SCHED_INCIDENT_WINDOW", "1800"))
+
+CPU_THRESHOLD = float(os.getenv("CPU_THRESHOLD", "80.0"))
+RAM_THRESHOLD = float(os.getenv("RAM_THRESHOLD", "90.0"))
+
+# CPU over 0.5s plus memory in one round trip
+SAMPLE_COMMAND = "head -1 /proc/stat; sleep 0.5; head -1 /proc/stat; grep -E '^(MemTotal|MemAvailable):' /proc/meminfo"
+
+def parse_sample(output: str) -> dict:
+    lines = output.splitlines()
+    cpu = [[int(v) for v in l.split()[1:9]] for l in lines if l.startswith("cpu ")]
+    cpu_usage = 0.0
+    if len(cpu) == 2:
+        # idle + iowait over total, as in agent.py
+        total = sum(cpu[1]) - sum(cpu[0])
+        idle = (cpu[1][3] + cpu[1][4]) - (cpu[0][3] + cpu[0][4])
+        cpu_usage = round((1 - idle / total) * 100, 2) if total > 0 else 0.0
+    mem = {l.split(":")[0]: int(l.split()[1]) for l in lines if l.startswith("Mem")}
+    total_kb = mem.get("MemTotal", 0)
+    ram_usage = round((total_kb - mem.get("MemAvailable", 0)) / total_kb * 100, 2) if total_kb else 0.0
+    return {"cpu_usage": cpu_usage, "ram_usage": ram_usage}
+
+def sample_host(host: str) -> dict:
+    """
+    One sample of a host (blocking): cpu/ram, disks and network rates.
+    Raises ConnectionError if the host can't be reached.
+    """
+    pushed = agent_hub.get_metrics(host)
+    if pushed:
+        return {k: pushed[k] for k in ("cpu_usage", "ram_usage", "disks", "net")}
+    output = run_command(SAMPLE_COMMAND, host)
+    if _is_error(output):
+        raise ConnectionError(output)
+    metrics = parse_sample(output)
+    metrics["disks"] = collect_disk_metrics(host)
+    metrics["net"] = collect_net_metrics(host)
+    return metrics
+
+def detect_anomalies(metrics: dict) -> List[str]:
+    anomalies = []
+    if metrics.get("cpu_usage", 0) > CPU_THRESHOLD:
+        anomalies.append(f"High CPU Usage: {metrics['cpu_usage']}% (Threshold: {CPU_THRESHOLD}%)")
+    if metrics.get("ram_usage", 0) > RAM_THRESHOLD:
+        anomalies.append(f"High RAM Usage: {metrics['ram_usage']:.1f}%")
+    anomalies.extend(detect_disk_anomalies(metrics.get("disks", {})))
+    anomalies.extend(detect_net_anomalies(metrics.get("net", {})))
+    return anomalies
+
+def near_threshold(metrics: dict, ratio: float = SCHED_NEAR_RATIO) -> bool:
+    disks = metrics.get("disks", {})
+    return (
+        metrics.get("cpu_usage", 0) > CPU_THRESHOLD * ratio
+        or metrics.get("ram_usage", 0) > RAM_THRESHOLD * ratio
+        or any(d.get("used_pct", 0) > DISK_THRESHOLD * ratio for d in disks.values())
+    )
+
+def has_active_incident(host: str, window: float = SCHED_INCIDENT_WINDOW) -> bool:
+    latest = incidents.store.query(host=host, limit=1)
+    return bool(latest) and latest[0]["outcome"] == "open" and latest[0]["started"] > time.time() - window
+
+@dataclass
+class HostSchedule:
+    host: str
+    interval: float = SCHED_BASE_INTERVAL
+    state: str = "new"          # hot | warm | calm | unreachable
+    calm_streak: int = 0
+    failures: int = 0
+    last_sample: float = 0.0
+    next_run: float = 0.0
+    metrics: dict = field(default_factory=dict)
+    anomalies: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+def next_interval(sched: HostSchedule, metrics: Optional[dict], anomalies: List[str], active_incident: bool):
+    """
+    Interval (before jitter) and state after a sample. metrics is None when the host was unreachable.
+    """
+    if metrics is None:
+        # Exponential backoff (base*2, base*4, ...), never earlier than the SSH breaker would let us through
+        backoff = min(SCHED_MAX_INTERVAL, SCHED_BASE_INTERVAL * 2 ** min(sched.failures, 16))
+        return max(backoff, breaker.state(sched.host)["retry_in"]), "unreachable"
+    if anomalies or active_incident:
+        return SCHED_MIN_INTERVAL, "hot"
+    if near_threshold(metrics):
+        return max(SCHED_MIN_INTERVAL, SCHED_BASE_INTERVAL / 2), "warm"
+    # Stable: slow down a little more after every calm sample
+    if sched.state == "calm" and sched.calm_streak >= 1:
+        return min(SCHED_MAX_INTERVAL, max(SCHED_BASE_INTERVAL, sched.interval * 1.5)), "calm"
+    return SCHED_BASE_INTERVAL, "calm"
+
+def jittered(interval: float, jitter: float = SCHED_JITTER) -> float:
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+class AdaptiveScheduler:
+    """
+    Samples each host on its own adaptive interval: fast while it is near a
+    threshold or has an active incident, slower while it stays calm, with
+    exponential backoff while unreachable. One asyncio task per host.
+    """
+    def __init__(self, sample: Callable[[str], dict] = sample_host, concurrency: int = SCHED_CONCURRENCY):
+        self.sample = sample
+        self.concurrency = concurrency
+        self.hosts: Dict[str, HostSchedule] = {}
+        self.on_change = None    # async callable(host, anomalies, previous) when a host's anomalies change
+        self._tasks: List[asyncio.Task] = []
+        self._sem = None
+
+    def start(self, hosts: list = None):
+        """
+        Starts sampling the given host names (default: every host in hosts.json).
+        """
+        if self._tasks:
+            return
+        names = hosts if hosts is not None else [h["name"] for h in load_hosts()] or ["local"]
+        self._sem = asyncio.Semaphore(max(1, self.concurrency))
+        for name in names:
+            # First probes spread over one base interval
+            sched = HostSchedule(host=name, next_run=time.monotonic() + random.uniform(0, SCHED_BASE_INTERVAL))
+            self.hosts[name] = sched
+            self._tasks.append(asyncio.create_task(self._run(sched)))
+        print(f"Adaptive scheduler sampling {len(names)} host(s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, sched: HostSchedule):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(max(0.0, sched.next_run - time.monotonic()))
+            async with self._sem:
+                start = time.perf_counter()
+                try:
+                    metrics = await loop.run_in_executor(None, contextvars.copy_context().run, self.sample, sched.host)
+                    sched.error, sched.failures = None, 0
+                except Exception as e:
+                    metrics = None
+                    sched.error, sched.failures = str(e)[:200], sched.failures + 1
+                perf.record("scheduler.sample", sched.host, time.perf_counter() - start, ok=metrics is not None)
+
+            anomalies = detect_anomalies(metrics) if metrics is not None else []
+            # The incident log lookup may hit the disk
+            active = metrics is not None and await loop.run_in_executor(None, has_active_incident, sched.host)
+            interval, state = next_interval(sched, metrics, anomalies, active)
+            sched.calm_streak = sched.calm_streak + 1 if state == "calm" else 0
+            if metrics is not None:
+                previous, sched.metrics, sched.anomalies = sched.anomalies, metrics, anomalies
+                if fingerprint(anomalies) != fingerprint(previous) and self.on_change:
+                    try:
+                        await self.on_change(sched.host, anomalies, previous)
+                    except Exception as e:
+                        print(f"Scheduler notification failed: {e}")
+            sched.interval, sched.state = interval, state
+            sched.last_sample = time.time()
+            sched.next_run = time.monotonic() + jittered(interval)
+
+    def anomalies(self) -> Dict[str, List[str]]:
+        """
+        Latest anomalies per host (hosts without anomalies are left out).
+        monitor_node adds them to the state; on_change alerts on changes.
+        """
+        return {name: s.anomalies for name, s in self.hosts.items() if s.anomalies}
+
+    def snapshot(self) -> List[dict]:
+        now = time.monotonic()
+        return [{
+            "host": s.host, "state": s.state, "interval": s.interval,
+            "next_in": max(0.0, s.next_run - now), "cpu": s.metrics.get("cpu_usage"),
+            "ram": s.metrics.get("ram_usage"), "anomalies": s.anomalies, "error": s.error
+        } for s in self.hosts.values()]
+
+def format_schedule(snapshot: List[dict]) -> str:
+    if not snapshot:
+        return "Scheduler not running (SCHEDULER_ENABLED=true to enable)."
+    lines = [f"{'HOST':<14} {'STATE':<12} {'EVERY':>6} {'NEXT':>6} {'CPU%':>6} {'RAM%':>6}"]
+    for s in sorted(snapshot, key=lambda x: x["host"]):
+        cpu = f"{s['cpu']:.1f}" if s["cpu"] is not None else "-"
+        ram = f"{s['ram']:.1f}" if s["ram"] is not None else "-"
+        lines.append(f"{s['host'][:14]:<14} {s['state']:<12} {s['interval']:>5.0f}s {s['next_in']:>5.0f}s {cpu:>6} {ram:>6}")
+        for a in s["anomalies"]:
+            lines.append(f"  ! {a}")
+        if s["error"]:
+            lines.append(f"  ✗ {s['error'][:120]}")
+    return "\n".join(lines)
+
+scheduler = AdaptiveScheduler()
@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(DATA_DIR, "search_cache.db"))
+# Error strings rarely change meaning: keep results for a week by default
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+_HEX_RE = re.compile(r"0x[0-9a-f]+")
+_SPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form used as cache key: case, quotes, whitespace and memory
+    addresses don't change what an error message means.
+    """
+    q = query.strip().strip("\"'`").lower()
+    q = _HEX_RE.sub("0x", q)
+    return _SPACE_RE.sub(" ", q).strip()
+
+class SearchCache:
+    """
+    On-disk query -> results cache with TTL and LRU eviction by entry count.
+    """
+    def __init__(self, path: str = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL,
+                 max_entries: int = SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._ready = False
+
+    @contextmanager
+    def _connect(self):
+        """
+        Short-lived connection (safe from any executor thread), committed and closed on exit.
+        """
+        if not self._ready and os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                if not self._ready:
+                    self._create_schema(conn)
+                    self._ready = True
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache ("
+            " key TEXT PRIMARY KEY, results TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed)")
+
+    @staticmethod
+    def _key(query: str, max_results: int) -> str:
+        return f"{max_results}:{normalize_query(query)}"
+
+    def get(self, query: str, max_results: int) -> Optional[list]:
+        key = self._key(query, max_results)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute("SELECT results, created FROM search_cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    return None
+                conn.execute("UPDATE search_cache SET accessed = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Search cache read failed: {e}")
+            return None
+
+    def put(self, query: str, max_results: int, results: list):
+        # An empty result may be a transient DuckDuckGo problem: don't pin it for the whole TTL
+        if not results:
+            return
+        key = self._key(query, max_results)
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, results, created, accessed, hits) VALUES (?, ?, ?, ?, 0)",
+                    (key, json.dumps(results), now, now)
+                )
+                # Size-based eviction: drop expired entries, then least recently used
+                conn.execute("DELETE FROM search_cache WHERE created < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM search_cache WHERE key IN ("
+                    " SELECT key FROM search_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            print(f"Search cache write failed: {e}")
+
+    def stats(self) -> dict:
+        try:
+            with self._lock, self._connect() as conn:
+                entries, hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM search_cache").fetchone()
+            return {"entries": entries, "hits": hits}
+        except sqlite3.Error:
+            return {"entries": 0, "hits": 0}
+
+cache = SearchCache()
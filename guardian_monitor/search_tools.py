@@ -1,24 +1,81 @@
+import os
+import time
+import asyncio
+import threading
 import warnings
 # Suppress warning about package rename
 warnings.filterwarnings("ignore", category=RuntimeWarning, module="duckduckgo_search")
-from duckduckgo_search import DDGS
+from guardian_monitor import perf
+from guardian_monitor.search_cache import cache
+
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "15"))
+
+# One client for the whole process (keeps its HTTP session), used one query at a time
+_client = None
+_client_lock = threading.Lock()
+
+def _fetch(query: str, max_results: int) -> list:
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Imported on the first search, not at startup
+            from duckduckgo_search import DDGS
+            _client = DDGS(timeout=int(SEARCH_TIMEOUT))
+        with perf.timed("search.duckduckgo", "duckduckgo"):
+            return _client.text(query, max_results=max_results) or []
+
+def _format_results(results: list) -> str:
+    if not results:
+        return "No results found."
+
+    summary = ""
+    for i, r in enumerate(results, 1):
+        title = r.get('title', 'No Title')
+        body = r.get('body', 'No Description')
+        href = r.get('href', '#')
+        summary += f"{i}. [{title}]({href}): {body}\n"
+
+    return summary
+
+def _cached(query: str, max_results: int):
+    start = time.perf_counter()
+    results = cache.get(query, max_results)
+    if results is not None:
+        perf.record("search.cache_hit", "sqlite", time.perf_counter() - start)
+    return results
 
 def search_duckduckgo(query: str, max_results=3) -> str:
     """
     Searches DuckDuckGo and returns a summary string of the top results.
+    Results are served from the on-disk cache when the same query was seen recently.
+    """
+    results = _cached(query, max_results)
+    if results is not None:
+        return _format_results(results)
+
+    try:
+        results = _fetch(query, max_results)
+        cache.put(query, max_results, results)
+        return _format_results(results)
+    except Exception as e:
+        return f"Search failed: {str(e)}"
+
+async def asearch_duckduckgo(query: str, max_results=3, timeout: float = SEARCH_TIMEOUT) -> str:
+    """
+    Async variant of search_duckduckgo with an overall timeout.
+    Cache access and the network call run in the default executor so the event loop never blocks.
     """
+    loop = asyncio.get_event_loop()
+    results = await loop.run_in_executor(None, _cached, query, max_results)
+    if results is not None:
+        return _format_results(results)
+
     try:
-        results = DDGS().text(query, max_results=max_results)
-        if not results:
-            return "No results found."
-            
-        summary = ""
-        for i, r in enumerate(results, 1):
-            title = r.get('title', 'No Title')
-            body = r.get('body', 'No Description')
-            href = r.get('href', '#')
-            summary += f"{i}. [{title}]({href}): {body}\n"
-            
-        return summary
+        results = await asyncio.wait_for(loop.run_in_executor(None, _fetch, query, max_results), timeout)
+    except asyncio.TimeoutError:
+        return f"Search failed: timed out after {timeout:g}s"
     except Exception as e:
         return f"Search failed: {str(e)}"
+
+    await loop.run_in_executor(None, cache.put, query, max_results, results)
+    return _format_results(results)
@@ -1,13 +1,186 @@
 import subprocess
-import paramiko
 import os
 import json
+import time
+import signal
+import random
+import threading
+import contextvars
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from guardian_monitor import perf
 
 load_dotenv()
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "hosts.json")
 
+# Consecutive SSH connect failures before a host's circuit opens
+BREAKER_THRESHOLD = int(os.getenv("SSH_BREAKER_THRESHOLD", "3"))
+# First open period; doubles with every further failure up to the max (seconds)
+BREAKER_BASE_DELAY = float(os.getenv("SSH_BREAKER_BASE_DELAY", "15"))
+BREAKER_MAX_DELAY = float(os.getenv("SSH_BREAKER_MAX_DELAY", "600"))
+
+def _load_config() -> dict:
+    if not os.path.exists(CONFIG_PATH):
+        return {}
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading hosts.json: {e}")
+        return {}
+
+def load_hosts() -> list:
+    """
+    Returns the list of hosts defined in config/hosts.json (empty if missing/invalid).
+    """
+    return _load_config().get("hosts", [])
+
+def load_groups() -> dict:
+    """
+    Host groups from hosts.json: {"groups": {"web": ["web1", "web2"], ...}}.
+    """
+    return _load_config().get("groups", {})
+
+def resolve_hosts(selector: str) -> list:
+    """
+    Expands a host selector into host names from hosts.json. The selector is a
+    comma-separated list of host names, group names, tags (or 'tag:<tag>') and 'all'.
+    Raises ValueError for names that match nothing.
+    """
+    config = _load_config()
+    hosts = config.get("hosts", []) or [{"name": "local", "type": "local"}]
+    groups = {k.lower(): v for k, v in config.get("groups", {}).items()}
+    by_name = {h["name"].lower(): h["name"] for h in hosts}
+    
+    names, unknown = [], []
+    for item in (p.strip() for p in (selector or "all").split(",")):
+        if not item:
+            continue
+        key = item.lower()
+        tag = key[4:] if key.startswith("tag:") else key
+        if key == "all":
+            matched = [h["name"] for h in hosts]
+        elif key in by_name:
+            matched = [by_name[key]]
+        elif key in groups:
+            matched = [by_name.get(n.lower(), n) for n in groups[key]]
+        else:
+            matched = [h["name"] for h in hosts if tag in (t.lower() for t in h.get("tags", []))]
+        if not matched:
+            unknown.append(item)
+        names.extend(n for n in matched if n not in names)
+    
+    if unknown:
+        raise ValueError(f"Unknown host, group or tag: {', '.join(unknown)}")
+    return names
+
+class CancelScope:
+    """
+    Tracks the commands started on behalf of one request so they can all be
+    stopped at once: local process groups are killed, SSH connections closed.
+    """
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._handles = set()
+        self._lock = threading.Lock()
+
+    def register(self, close) -> bool:
+        """
+        Registers a callable that aborts a running command. Returns False (and
+        aborts right away) if the scope was already cancelled.
+        """
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._handles.add(close)
+                return True
+        close()
+        return False
+
+    def unregister(self, close):
+        with self._lock:
+            self._handles.discard(close)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            handles, self._handles = list(self._handles), set()
+        for close in handles:
+            try:
+                close()
+            except Exception as e:
+                print(f"Warning: Failed to abort command: {e}")
+
+class CircuitBreaker:
+    """
+    Per-host SSH circuit breaker. After BREAKER_THRESHOLD consecutive connect
+    failures the host is skipped for an exponentially growing, jittered delay;
+    when it expires a single probe is let through (half-open).
+    """
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, base_delay: float = BREAKER_BASE_DELAY,
+                 max_delay: float = BREAKER_MAX_DELAY):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._hosts = {}  # host -> [consecutive failures, open until (monotonic)]
+        self._lock = threading.Lock()
+
+    def allow(self, host: str) -> bool:
+        with self._lock:
+            entry = self._hosts.get(host.lower())
+            if not entry or entry[1] == 0:
+                return True
+            now = time.monotonic()
+            if now < entry[1]:
+                return False
+            # Half-open: this caller probes, the others keep failing fast meanwhile
+            entry[1] = now + self.base_delay
+            return True
+
+    def failure(self, host: str):
+        with self._lock:
+            entry = self._hosts.setdefault(host.lower(), [0, 0.0])
+            entry[0] += 1
+            if entry[0] >= self.threshold:
+                delay = min(self.max_delay, self.base_delay * 2 ** (entry[0] - self.threshold))
+                entry[1] = time.monotonic() + delay * random.uniform(0.8, 1.2)
+
+    def success(self, host: str):
+        with self._lock:
+            self._hosts.pop(host.lower(), None)
+
+    def state(self, host: str) -> dict:
+        """
+        {"failures", "open", "retry_in"} for a host.
+        """
+        with self._lock:
+            failures, until = self._hosts.get(host.lower(), [0, 0.0])
+        retry_in = max(0.0, until - time.monotonic()) if until else 0.0
+        return {"failures": failures, "open": retry_in > 0, "retry_in": retry_in}
+
+breaker = CircuitBreaker()
+
+_cancel_scope = contextvars.ContextVar("guardian_cancel_scope", default=None)
+
+@contextmanager
+def cancel_scope(scope: CancelScope):
+    """
+    Commands run inside this block (including executor threads started with
+    contextvars.copy_context()) are registered in `scope`.
+    """
+    token = _cancel_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _cancel_scope.reset(token)
+
+def _kill_process_group(proc: subprocess.Popen):
+    if proc.poll() is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
 def _load_host_config(target_host: str):
     """
     Loads host details from config/hosts.json.
@@ -19,22 +192,50 @@ def _load_host_config(target_host: str):
             return {"type": "local"}
         return None
         
-    try:
-        with open(CONFIG_PATH, 'r') as f:
-            data = json.load(f)
-            
-        for host in data.get("hosts", []):
-            if host["name"].lower() == target_host.lower():
-                return host
-    except Exception as e:
-        print(f"Error reading hosts.json: {e}")
+    for host in load_hosts():
+        if host["name"].lower() == target_host.lower():
+            return host
         
     return None
 
+def _ssh_connect(host_config: dict, timeout: float = 10) -> "paramiko.SSHClient":
+    """
+    Opens an SSH connection to a host from hosts.json.
+    """
+    # Imported on first connection: paramiko is slow to import and local-only setups never need it
+    import paramiko
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    
+    connect_kwargs = {
+        "hostname": host_config.get("ip"),
+        "username": host_config.get("user"),
+        "port": int(host_config.get("port", 22))
+    }
+    if host_config.get("key_path"):
+        connect_kwargs["key_filename"] = host_config["key_path"]
+        
+    with perf.timed("ssh.connect", host_config.get("name", connect_kwargs["hostname"])):
+        client.connect(**connect_kwargs, timeout=timeout)
+    return client
+
+def _is_error(result: str) -> bool:
+    return result.startswith("Error") or (result.startswith("SSH Connection to") and "failed" in result[:200])
+
 def run_command(cmd: str, target_host: str = "local") -> str:
     """
     Executes a command on the target host defined in hosts.json.
+    Inside a cancel_scope the command is aborted when the scope is cancelled.
     """
+    scope = _cancel_scope.get()
+    if scope and scope.cancelled.is_set():
+        return f"Error: Command '{cmd}' cancelled."
+    start = time.perf_counter()
+    result = _run_command(cmd, target_host, scope)
+    perf.record("command", target_host, time.perf_counter() - start, ok=not _is_error(result))
+    return result
+
+def _run_command(cmd: str, target_host: str = "local", scope: CancelScope = None) -> str:
     host_config = _load_host_config(target_host)
     
     if not host_config:
@@ -42,43 +243,59 @@ def run_command(cmd: str, target_host: str = "local") -> str:
         
     # LOCAL EXECUTION
     if host_config.get("type", "local") == "local":
+        # Own process group so cancellation also kills the shell's children
+        proc = subprocess.Popen(
+            cmd, 
+            shell=True, 
+            stdout=subprocess.PIPE, 
+            stderr=subprocess.PIPE, 
+            text=True,
+            start_new_session=True
+        )
+        abort = lambda: _kill_process_group(proc)
+        if scope:
+            scope.register(abort)
         try:
-            result = subprocess.run(
-                cmd, 
-                shell=True, 
-                check=True, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                text=True
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError as e:
-            return f"Error executing command '{cmd}': {e.stderr}"
+            stdout, stderr = proc.communicate()
+        finally:
+            if scope:
+                scope.unregister(abort)
+        if scope and scope.cancelled.is_set():
+            return f"Error: Command '{cmd}' cancelled."
+        if proc.returncode != 0:
+            return f"Error executing command '{cmd}': {stderr}"
+        return stdout.strip()
             
     # SSH EXECUTION
     elif host_config.get("type") == "ssh":
-        ip = host_config.get("ip")
-        user = host_config.get("user")
-        key_path = host_config.get("key_path")
-        
-        # print(f"[SSH] Connecting to {target_host} ({ip})...")
+        # print(f"[SSH] Connecting to {target_host} ({host_config.get('ip')})...")
+        if not breaker.allow(target_host):
+            st = breaker.state(target_host)
+            return (f"SSH Connection to {target_host} failed: host unreachable ({st['failures']} failed attempts), "
+                    f"next retry in {st['retry_in']:.0f}s")
         try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            connect_kwargs = {"hostname": ip, "username": user}
-            if key_path:
-                connect_kwargs["key_filename"] = key_path
+            try:
+                client = _ssh_connect(host_config)
+            except Exception:
+                breaker.failure(target_host)
+                raise
+            breaker.success(target_host)
+            # Closing the connection ends the remote session (and its command)
+            if scope and not scope.register(client.close):
+                return f"Error: Command '{cmd}' cancelled."
+            try:
+                stdin, stdout, stderr = client.exec_command(cmd)
+                exit_status = stdout.channel.recv_exit_status()
                 
-            client.connect(**connect_kwargs, timeout=10)
-            stdin, stdout, stderr = client.exec_command(cmd)
-            exit_status = stdout.channel.recv_exit_status()
-            
-            out = stdout.read().decode().strip()
-            err = stderr.read().decode().strip()
-            
-            client.close()
+                out = stdout.read().decode().strip()
+                err = stderr.read().decode().strip()
+            finally:
+                if scope:
+                    scope.unregister(client.close)
+                client.close()
             
+            if scope and scope.cancelled.is_set():
+                return f"Error: Command '{cmd}' cancelled."
             if exit_status != 0:
                 return f"Error (Status {exit_status}): {err}"
             return out
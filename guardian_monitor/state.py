@@ -1,4 +1,5 @@
-from typing import TypedDict, List, Dict, Optional, Any
+from typing import TypedDict, List, Dict, Optional, Any, Literal
+from pydantic import BaseModel, Field
 
 class GuardianState(TypedDict):
     """
@@ -12,3 +13,13 @@ class GuardianState(TypedDict):
     human_approval: bool     # Whether the user approved the action
     investigation_history: List[str] # Log of executed commands and outputs
     steps_count: int         # Counter to prevent infinite loops
+    host: str                # Host the anomalies come from (default 'local')
+    incident_id: Optional[str] # Incident log id (see incidents.py), None while healthy
+
+class Diagnosis(BaseModel):
+    """
+    Structured output of the diagnosis LLM (also used as Ollama's JSON schema).
+    """
+    diagnosis: str = Field(description="Specific explanation of the root cause or current finding")
+    proposed_action: str = Field(description="A SINGLE shell command, 'search \"query\"' or 'FINISH'")
+    action_type: Literal["investigate", "fix", "finish"] = Field(description="investigate, fix or finish")
@@ -0,0 +1,150 @@
+import os
+import time
+from telegram.error import BadRequest, RetryAfter
+from guardian_monitor import perf
+
+# Minimum seconds between edits of the same message (Telegram rate-limits edits)
+TELEGRAM_EDIT_INTERVAL = float(os.getenv("TELEGRAM_EDIT_INTERVAL", "1.5"))
+TELEGRAM_MAX_LEN = 4096
+# Room left for the status line while streaming
+PREVIEW_MAX_LEN = 3500
+
+TOOL_LABELS = {
+    "get_system_metrics": "Revisando métricas",
+    "execute_terminal_command": "Ejecutando",
+    "execute_on_hosts": "Ejecutando",
+    "read_system_logs": "Leyendo logs",
+    "get_process_activity": "Revisando procesos",
+    "web_search": "Buscando en la web",
+    "search_incidents": "Buscando incidentes previos",
+    "run_checks": "Ejecutando chequeos",
+    "save_knowledge": "Guardando conocimiento"
+}
+
+def describe_tool(name: str, tool_input) -> str:
+    """
+    "Ejecutando `df -h` en Senpai…" from a tool start event.
+    """
+    args = tool_input if isinstance(tool_input, dict) else {}
+    label = TOOL_LABELS.get(name, f"Usando {name}")
+    detail = args.get("command") or args.get("query") or args.get("log_source") or ""
+    text = f"⚙️ {label}"
+    if detail:
+        text += f" `{str(detail)[:80]}`"
+    if args.get("target_host") or args.get("hosts"):
+        text += f" en {args.get('target_host') or args['hosts']}"
+    return text + "…"
+
+class StreamingReply:
+    """
+    One Telegram message that is edited in place while the agent works:
+    a status line for tool calls plus the tokens generated so far.
+    Edits are throttled to TELEGRAM_EDIT_INTERVAL.
+    """
+    def __init__(self, bot, chat_id, min_interval: float = TELEGRAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.message_id = None
+        self.status = ""
+        self.tokens = ""
+        self._last_edit = 0.0
+        self._last_text = ""
+
+    async def start(self, text: str = "🤔 Pensando…"):
+        try:
+            msg = await self.bot.send_message(chat_id=self.chat_id, text=text)
+            self.message_id = msg.message_id
+            self._last_text = text
+            self._last_edit = time.monotonic()
+        except Exception as e:
+            print(f"Warning: Failed to send placeholder message: {e}")
+
+    def _render(self) -> str:
+        body = self.tokens.strip()
+        if len(body) > PREVIEW_MAX_LEN:
+            body = "…" + body[-PREVIEW_MAX_LEN:]
+        parts = [p for p in (self.status, body) if p]
+        return "\n\n".join(parts) or "🤔 Pensando…"
+
+    async def _edit(self, text: str, parse_mode=None) -> bool:
+        if self.message_id is None or text == self._last_text:
+            return True
+        start = time.perf_counter()
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id, message_id=self.message_id, text=text, parse_mode=parse_mode
+            )
+            self._last_text = text
+            return True
+        except RetryAfter as e:
+            # Back off as requested by Telegram
+            retry = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self._last_edit = time.monotonic() + float(retry)
+            return False
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return True
+            if parse_mode:
+                return False
+            print(f"Warning: Failed to edit message: {e}")
+            return False
+        except Exception as e:
+            print(f"Warning: Failed to edit message: {e}")
+            return False
+        finally:
+            perf.record("telegram.edit", "telegram", time.perf_counter() - start)
+
+    async def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_edit < self.min_interval:
+            return
+        self._last_edit = now
+        await self._edit(self._render())
+
+    async def set_status(self, text: str):
+        self.status = text
+        await self.refresh()
+
+    async def new_step(self):
+        """
+        A new LLM step started: text from the previous step was intermediate.
+        """
+        self.tokens = ""
+
+    async def add_tokens(self, text: str):
+        self.tokens += text
+        await self.refresh()
+
+    async def finish(self, text: str):
+        """
+        Replaces the streamed preview with the final answer (Markdown, falling
+        back to plain text). Long answers continue in extra messages.
+        """
+        chunks = [text[i:i + TELEGRAM_MAX_LEN] for i in range(0, len(text), TELEGRAM_MAX_LEN)] or ["(sin respuesta)"]
+        # Always re-send: the preview may hold the same text without Markdown applied
+        self._last_text = None
+        if self.message_id is None or not (await self._edit(chunks[0], "Markdown") or await self._edit(chunks[0])):
+            await self.bot.send_message(chat_id=self.chat_id, text=chunks[0])
+        for chunk in chunks[1:]:
+            await self.bot.send_message(chat_id=self.chat_id, text=chunk)
+
+    async def handle_event(self, event: dict):
+        """
+        Consumes astream_events(version="v2") events from the agent graph.
+        """
+        kind = event.get("event")
+        if kind == "on_chat_model_start":
+            await self.new_step()
+        elif kind == "on_chat_model_stream":
+            chunk = event.get("data", {}).get("chunk")
+            content = getattr(chunk, "content", "")
+            if isinstance(content, str) and content:
+                await self.add_tokens(content)
+        elif kind == "on_tool_start":
+            await self.set_status(describe_tool(event.get("name", ""), event.get("data", {}).get("input")))
+        elif kind == "on_tool_end":
+            await self.set_status(f"✅ {TOOL_LABELS.get(event.get('name', ''), event.get('name', ''))} listo")
+        elif kind == "on_route_retry":
+            self.tokens = ""
+            await self.set_status("🧠 Consultando al modelo grande…")
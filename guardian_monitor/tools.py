@@ -1,12 +1,28 @@
 import asyncio
 import os
+import contextvars
 from langchain_core.tools import tool
-from guardian_monitor.ssh_tools import run_command
+from guardian_monitor.ssh_tools import run_command, resolve_hosts
+from guardian_monitor.fanout import run_on_hosts, aggregate
+from guardian_monitor.compact import compact_output, strip_noise
 from guardian_monitor.search_tools import search_duckduckgo
+from guardian_monitor.proc_snapshot import sample_processes, format_deltas
+from guardian_monitor.agent_hub import hub as agent_hub
+from guardian_monitor import incidents, checks
+from guardian_monitor.metrics import (
+    collect_disk_metrics, collect_net_metrics, detect_disk_anomalies, detect_net_anomalies,
+    format_disks, format_net
+)
 # Knowledge Path
 import os
 KNOWLEDGE_FILE = os.path.join(os.path.dirname(__file__), "knowledge.md")
 
+def _in_executor(loop, fn, *args):
+    """
+    run_in_executor that carries the caller's context (e.g. the chat's cancel scope) into the worker thread.
+    """
+    return loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+
 @tool
 def get_system_metrics(target_host: str = "local") -> str:
     """
@@ -35,61 +51,58 @@ async def _async_get_metrics(host: str):
     
     # helper for concise calls
     async def run(cmd):
-        return await loop.run_in_executor(None, run_command, cmd, host)
+        return await _in_executor(loop, run_command, cmd, host)
 
-    # 1. CPU Usage (Top)
-    # Check connectivity FIRST
-    connectivity_check = await run("echo 'ok'")
-    if "Error" in connectivity_check or "failed" in connectivity_check:
-        return f"CRITICAL ERROR: Could not connect to host '{host}'. Details: {connectivity_check}\nPlease verify 'guardian_monitor/config/hosts.json'."
+    pushed = agent_hub.get_metrics(host)
+    if pushed:
+        # Agent mode: host metrics come from the pushed stream, no exec round trips
+        cpu_usage, ram_usage = pushed["cpu_usage"], pushed["ram_usage"]
+        disks, net = pushed["disks"], pushed["net"]
+        disk_usage = disks.get("/", {}).get("used_pct", 0.0)
+    else:
+        # 1. CPU Usage (Top)
+        # Check connectivity FIRST
+        connectivity_check = await run("echo 'ok'")
+        if "Error" in connectivity_check or "failed" in connectivity_check:
+            return f"CRITICAL ERROR: Could not connect to host '{host}'. Details: {connectivity_check}\nPlease verify 'guardian_monitor/config/hosts.json'."
 
-    try:
-        top_cpu = await run("top -bn2 -d 0.5 | grep 'Cpu(s)' | tail -n 1")
-        parts = top_cpu.split(",")
-        idle_str = [x for x in parts if "id" in x][0]
-        idle_val = float(idle_str.split("id")[0].strip())
-        cpu_usage = round(100.0 - idle_val, 2)
-    except:
-        cpu_usage = 0.0
-
-    # 2. RAM Usage
-    try:
-        free_output = await run("free -m")
-        lines = free_output.splitlines()
-        mem_line = [l for l in lines if l.startswith("Mem:")][0]
-        parts = mem_line.split()
-        total_ram = int(parts[1])
-        used_ram = int(parts[2])
-        ram_usage = round((used_ram / total_ram) * 100, 2)
-    except:
-        ram_usage = 0.0
-
-    # 3. Disk Usage (Root)
-    try:
-        df_output = await run("df -h /")
-        lines = df_output.splitlines()
-        disk_line = [l for l in lines if l.endswith("/")][0]
-        disk_usage_str = [x for x in disk_line.split() if x.endswith("%")][0]
-        disk_usage = float(disk_usage_str.strip("%"))
-    except:
-        disk_usage = 0.0
+        try:
+            top_cpu = await run("top -bn2 -d 0.5 | grep 'Cpu(s)' | tail -n 1")
+            parts = top_cpu.split(",")
+            idle_str = [x for x in parts if "id" in x][0]
+            idle_val = float(idle_str.split("id")[0].strip())
+            cpu_usage = round(100.0 - idle_val, 2)
+        except:
+            cpu_usage = 0.0
+
+        # 2. RAM Usage
+        try:
+            free_output = await run("free -m")
+            lines = free_output.splitlines()
+            mem_line = [l for l in lines if l.startswith("Mem:")][0]
+            parts = mem_line.split()
+            total_ram = int(parts[1])
+            used_ram = int(parts[2])
+            ram_usage = round((used_ram / total_ram) * 100, 2)
+        except:
+            ram_usage = 0.0
+
+        # 3. Disk Usage (all real mounts, blocks + inodes)
+        disks = await _in_executor(loop, collect_disk_metrics, host)
+        disk_usage = disks.get("/", {}).get("used_pct", 0.0)
         
-    # 4. Network Stats
-    net_output = await run("cat /proc/net/dev")
-    
-    # 5. Top Processes
-    top_procs = await run("ps -eo pid,cmd,%mem,%cpu --sort=-%cpu | head -n 10")
-    
-    # Simple filtering (heuristic)
-    try:
-        top_procs_clean = "\n".join(top_procs.splitlines()[:6])
-    except:
-        top_procs_clean = ""
+        # 4. Network Stats (per-interface rates; first call samples twice 1s apart)
+        net = await _in_executor(loop, collect_net_metrics, host, 1.0)
+
+    # 5. Top Processes (structured snapshot, diffed against the previous one)
+    tracker = await _in_executor(loop, sample_processes, host)
+    top_procs_clean = format_deltas(tracker.top_consumers(5)) if tracker else "No data"
 
     # Status Labels
     cpu_status = "ALTA" if cpu_usage > cpu_thresh else "NORMAL"
     ram_status = "ALTA" if ram_usage > ram_thresh else "NORMAL"
     disk_status = "ALTA" if disk_usage > disk_thresh else "NORMAL"
+    alerts = detect_disk_anomalies(disks) + detect_net_anomalies(net)
     
     report = f"""
 [MÉTRICAS DEL SISTEMA: {host}]
@@ -97,21 +110,86 @@ CPU: {cpu_usage}% (Umbral: {cpu_thresh}%) [{cpu_status}]
 RAM: {ram_usage}% (Umbral: {ram_thresh}%) [{ram_status}]
 DISCO (/): {disk_usage}% (Umbral: {disk_thresh}%) [{disk_status}]
 
-[TRÁFICO DE RED]
-{net_output[:300] if net_output else "No data"}...
+[DISCOS]
+{format_disks(disks)}
+
+[RED]
+{format_net(net)}
+
+[ALERTAS]
+{chr(10).join(alerts) if alerts else "Ninguna"}
 
 [TOP PROCESOS]
 {top_procs_clean}
 """
     return report.strip()
 
+@tool
+def get_process_activity(target_host: str = "local", sort_by: str = "cpu", limit: int = 5) -> str:
+    """
+    Shows the top processes of a host from the full process table, with CPU/RSS
+    rates computed against the previous snapshot. Use it to spot runaway
+    processes and memory leaks without running ps repeatedly.
+    
+    Args:
+        target_host: The name of the host (default 'local').
+        sort_by: 'cpu' (top CPU now), 'mem' (largest RSS) or 'growth' (RSS growing over time).
+        limit: Number of processes to return (default 5).
+    """
+    # First call on a host takes two samples 1s apart so CPU rates are real
+    tracker = sample_processes(target_host, min_interval=1.0)
+    if tracker is None:
+        return f"Error: Could not read the process table of '{target_host}'."
+        
+    if sort_by == "growth":
+        deltas = tracker.top_growers(limit)
+        if not deltas:
+            return f"No growing processes detected on {target_host} (tracked since first snapshot)."
+    else:
+        deltas = tracker.top_consumers(limit, by=sort_by)
+        
+    return f"[PROCESOS: {target_host} | orden: {sort_by}]\n" + format_deltas(deltas)
+
+@tool
+def search_incidents(target_host: str = "", query: str = "", limit: int = 5) -> str:
+    """
+    Looks up past incidents: anomalies, diagnosis, commands run and outcome.
+    Use it to check whether an issue happened before and how it was solved.
+    
+    Args:
+        target_host: Only incidents of this host (default: all hosts).
+        query: Text to match in the anomalies or diagnosis (e.g. 'disk', 'nginx'),
+               or an incident fingerprint (fp=...) to list recurrences.
+        limit: Number of incidents to return, newest first (default 5).
+    """
+    query = query.strip()
+    if query.startswith("fp="):
+        found = incidents.store.query(host=target_host or None, fp=query[3:], limit=limit)
+    else:
+        found = incidents.store.query(host=target_host or None, text=query or None, limit=limit)
+    return incidents.format_incidents(found)
+
+@tool
+def run_checks(check: str = "", target_host: str = "") -> str:
+    """
+    Runs the configured health checks (systemd units, TCP ports, HTTP endpoints,
+    certificate expiry, containers, processes) and returns pass/fail per check.
+    Much faster than investigating by hand: use it first when something seems down.
+    
+    Args:
+        check: Only the check with this name (default: all checks).
+        target_host: Only checks against this host (default: all hosts).
+    """
+    results = checks.engine.refresh(check or None, target_host or None)
+    return compact_output(checks.format_results(results, check, target_host), "run_checks")
+
 @tool
 def web_search(query: str) -> str:
     """
     Searches the web for information using DuckDuckGo.
     Use this to look up error messages, solutions, or unknown Linux commands.
     """
-    return search_duckduckgo(query)
+    return compact_output(search_duckduckgo(query), "web_search")
 
 @tool
 def execute_terminal_command(command: str, target_host: str = "local") -> str:
@@ -125,7 +203,39 @@ def execute_terminal_command(command: str, target_host: str = "local") -> str:
     CRITICAL: Only use for diagnosis (ls, cat, ps) safely. 
     If a modification (kill, rm, restart) is needed, YOU MUST ASK THE USER FIRST.
     """
-    return run_command(command, target_host)
+    return compact_output(run_command(command, target_host), "execute_terminal_command")
+
+@tool
+def execute_on_hosts(command: str, hosts: str = "all") -> str:
+    """
+    Executes the same shell command on several servers at once and returns one
+    compact report: hosts with identical output are grouped, differences are
+    shown as a diff. Use it instead of calling execute_terminal_command once per
+    host (e.g. package versions, service state, disk usage across the fleet).
+    
+    Args:
+        command: The shell command to run on every host.
+        hosts: 'all', a group or tag from hosts.json, or a comma-separated list
+               of host names/groups/tags (e.g. 'docker', 'Nage,Senpai').
+    
+    CRITICAL: Only use for diagnosis (ls, cat, ps, systemctl status) safely.
+    Never run modifications (kill, rm, restart) on several hosts without asking the user first.
+    """
+    try:
+        names = resolve_hosts(hosts)
+    except ValueError as e:
+        return f"Error: {e}"
+    
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        
+    results = loop.run_until_complete(run_on_hosts(command, names))
+    # Only terminal noise (colors, progress bars) may differ between identical results
+    results = {host: strip_noise(out) for host, out in results.items()}
+    return compact_output(aggregate(command, results), "execute_on_hosts")
 
 @tool
 def save_knowledge(topic: str, content: str) -> str:
@@ -180,8 +290,8 @@ def read_system_logs(target_host: str = "local", log_source: str = "journal_erro
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         
-    return loop.run_until_complete(async_run_log_cmd(full_cmd, target_host))
+    return compact_output(loop.run_until_complete(async_run_log_cmd(full_cmd, target_host)), "read_system_logs")
 
 async def async_run_log_cmd(cmd, host):
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, run_command, cmd, host)
+    return await _in_executor(loop, run_command, cmd, host)
@@ -0,0 +1,31 @@
+#!/bin/bash
+# Import-time profile of the bot entry point (python -X importtime).
+# Usage: scripts/profile_import.sh [module] [top_n]
+#   scripts/profile_import.sh                          # guardian_monitor.main, top 25
+#   scripts/profile_import.sh guardian_monitor.graph 40
+# Set MAX_IMPORT_MS to fail (exit 1) when the total exceeds a budget, e.g. in CI.
+
+MODULE="${1:-guardian_monitor.main}"
+TOP="${2:-25}"
+PYTHON="${PYTHON:-python3}"
+
+cd "$(dirname "$0")/.." || exit 1
+
+PROFILE=$("$PYTHON" -X importtime -c "import $MODULE" 2>&1 >/dev/null) || { echo "$PROFILE"; exit 1; }
+
+echo "Slowest imports (cumulative µs) for $MODULE:"
+echo "$PROFILE" | grep '^import time:' | sort -t'|' -k2 -n -r | head -n "$TOP"
+
+TOTAL_US=$(echo "$PROFILE" | grep "| $MODULE\$" | awk -F'|' '{gsub(/ /, "", $2); print $2}')
+TOTAL_MS=$((TOTAL_US / 1000))
+echo
+echo "Total import time of $MODULE: ${TOTAL_MS} ms"
+
+# Heavy stacks that should stay out of the startup path
+LOADED=$("$PYTHON" -c "import sys, $MODULE; print(' '.join(m for m in ('langgraph', 'langchain_core', 'langchain_ollama', 'ollama', 'duckduckgo_search', 'paramiko') if m in sys.modules))")
+[ -n "$LOADED" ] && echo "Heavy modules loaded at import: $LOADED"
+
+if [ -n "$MAX_IMPORT_MS" ] && [ "$TOTAL_MS" -gt "$MAX_IMPORT_MS" ]; then
+    echo "❌ Import time ${TOTAL_MS} ms exceeds budget of ${MAX_IMPORT_MS} ms"
+    exit 1
+fi